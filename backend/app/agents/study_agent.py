@@ -1,92 +1,106 @@
+import time
+import logging
 from app.llm.ollama_client import get_ollama_llm
-import json
-from app.llm.prompts import get_study_prompt, get_file_study_prompt
-from app.memory.conversation import get_conversation_memory
-from langchain_core.output_parsers import StrOutputParser
+from app.llm.prompts import (
+    get_study_prompt, get_file_study_prompt,
+    SYSTEM_PROMPT, SESSION_STATE_PROMPT, FILE_STUDY_PROMPT, FILE_CONTEXT_PROMPT
+)
+from app.llm.prompt_budget import PromptBudget, estimate_tokens, log_budget_report
+from app.llm.scheduler import llm_scheduler, Priority
+from app.llm.metrics import llm_metrics
+from app.config import settings
+from app.memory.conversation import conversation_store
+
+logger = logging.getLogger(__name__)
 
 class StudyAgent:
     def __init__(self):
-        self.llm = get_ollama_llm()
+        self.llm = get_ollama_llm("chat")
+        self.stream_llm = get_ollama_llm("stream")
         self.prompt = get_study_prompt()
         self.file_prompt = get_file_study_prompt()
-        # In a real app, you'd manage memories in a dictionary or database
-        self.memories = {}
-
-    def _get_memory(self, user_id: str):
-        if user_id not in self.memories:
-            self.memories[user_id] = get_conversation_memory(user_id)
-        return self.memories[user_id]
+        # Whatever the routes say, the prompt plus a full-length answer must fit the context window
+        room = min(route["num_ctx"] - route["max_tokens"] for route in (settings.route("chat"), settings.route("stream")))
+        if room < settings.PROMPT_TOKEN_BUDGET:
+            logger.warning(f"Chat prompts are limited to {room} tokens by num_ctx minus num_predict")
+        self.budget = PromptBudget(min(settings.PROMPT_TOKEN_BUDGET, room), settings.PROMPT_TOKEN_SAFETY_FACTOR)
+        system_tokens = estimate_tokens(SYSTEM_PROMPT + SESSION_STATE_PROMPT)
+        if system_tokens > self.budget.estimated_budget:
+            # Ollama would then cut the prompt from the front whatever the budget drops
+            logger.warning(
+                f"The study system prompt alone is ~{system_tokens} estimated tokens but chat prompts get "
+                f"{self.budget.estimated_budget}; set NUM_CTX=4096 to fit it"
+            )
+        self.conversations = conversation_store
 
     def clear_memory(self, user_id: str):
-        if user_id in self.memories:
-            del self.memories[user_id]
+        self.conversations.clear(user_id)
+
+    def _build_params(self, user_id: str, input_text: str, history: list, profile, summary: str, context: str, is_file_context: bool):
+        # Fit every section into the token budget instead of letting Ollama truncate silently
+        if is_file_context:
+            params, report = self.budget.fit(FILE_STUDY_PROMPT + FILE_CONTEXT_PROMPT, input_text, history, context)
+        else:
+            params, report = self.budget.fit(
+                SYSTEM_PROMPT + SESSION_STATE_PROMPT, input_text, history, context, summary=summary, profile=profile
+            )
+        log_budget_report(user_id, self.budget.estimated_budget, report)
+        return params, sum(used for used, _ in report.values())
 
-    async def stream(self, user_id: str, input_text: str, profile, summary: str, context: str, is_file_context: bool = False):
-        memory = self._get_memory(user_id)
-        memory_vars = memory.load_memory_variables({})
-        history = memory_vars.get("history", [])
+    async def remember(self, user_id: str, input_text: str, output_text: str, session_id: str = "default"):
+        # Record a turn that was answered without calling the LLM (e.g. a cache hit)
+        await self.conversations.add_turn(user_id, session_id, input_text, output_text)
+
+    async def stream(self, user_id: str, input_text: str, profile, summary: str, context: str, is_file_context: bool = False,
+                     session_id: str = "default"):
+        history = await self.conversations.history(user_id, session_id)
         
         prompt = self.file_prompt if is_file_context else self.prompt
-        chain = prompt | self.llm | StrOutputParser()
+        chain = prompt | self.stream_llm
         
         full_response = ""
-        
-        params = {
-            "input": input_text,
-            "history": history,
-            "context": context
-        }
-        
-        if not is_file_context:
-            params.update({
-                "knowledge_level": profile.knowledge_level,
-                "known_concepts": ", ".join(profile.known_concepts),
-                "weak_areas": ", ".join(profile.weak_areas),
-                "explanation_preference": profile.explanation_preference,
-                "topic_mastery": json.dumps({k: v.dict() for k, v in profile.topics.items()}, default=str),
-                "summary": summary
-            })
+        params, prompt_tokens = self._build_params(user_id, input_text, history, profile, summary, context, is_file_context)
 
-        async for chunk in chain.astream(params):
-            full_response += chunk
-            yield chunk
+        response_metadata = {}
+        first_token_latency = None
+        async with llm_scheduler.slot(Priority.INTERACTIVE, user_id):
+            started = time.perf_counter()
+            async for chunk in chain.astream(params):
+                # Ollama's timings arrive on the final chunk
+                if chunk.response_metadata:
+                    response_metadata = chunk.response_metadata
+                if chunk.content:
+                    if first_token_latency is None:
+                        first_token_latency = time.perf_counter() - started
+                    full_response += chunk.content
+                    yield chunk.content
+            latency = time.perf_counter() - started
+        llm_metrics.record("stream", response_metadata, prompt_tokens, latency=latency, first_token_latency=first_token_latency)
         
         # Save the interaction after stream finishes
-        memory.save_context({"input": input_text}, {"output": full_response})
+        await self.conversations.add_turn(user_id, session_id, input_text, full_response)
 
-    async def run(self, user_id: str, input_text: str, profile, summary: str, context: str, is_file_context: bool = False):
-        memory = self._get_memory(user_id)
-        
-        # Load memory variables
-        memory_vars = memory.load_memory_variables({})
-        history = memory_vars.get("history", [])
+    async def run(self, user_id: str, input_text: str, profile, summary: str, context: str, is_file_context: bool = False,
+                  session_id: str = "default"):
+        history = await self.conversations.history(user_id, session_id)
         
         # Build the chain using LCEL
         prompt = self.file_prompt if is_file_context else self.prompt
-        chain = prompt | self.llm | StrOutputParser()
-        
-        params = {
-            "input": input_text,
-            "history": history,
-            "context": context
-        }
+        chain = prompt | self.llm
         
-        if not is_file_context:
-            params.update({
-                "knowledge_level": profile.knowledge_level,
-                "known_concepts": ", ".join(profile.known_concepts),
-                "weak_areas": ", ".join(profile.weak_areas),
-                "explanation_preference": profile.explanation_preference,
-                "topic_mastery": json.dumps({k: v.dict() for k, v in profile.topics.items()}, default=str),
-                "summary": summary
-            })
+        params, prompt_tokens = self._build_params(user_id, input_text, history, profile, summary, context, is_file_context)
 
-        output_text = await chain.ainvoke(params)
+        async with llm_scheduler.slot(Priority.INTERACTIVE, user_id):
+            started = time.perf_counter()
+            response = await chain.ainvoke(params)
+            latency = time.perf_counter() - started
+        llm_metrics.record("chat", response.response_metadata, prompt_tokens, latency=latency)
+        output_text = response.content
         
         # Save the interaction to memory
-        memory.save_context({"input": input_text}, {"output": output_text})
+        await self.conversations.add_turn(user_id, session_id, input_text, output_text)
         
         return {
             "output": output_text,
-            "history": memory.load_memory_variables({})["history"]
+            "history": await self.conversations.history(user_id, session_id)
         }
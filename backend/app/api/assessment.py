@@ -1,9 +1,19 @@
+import json
+import time
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from app.services.assessment_service import AssessmentService
+from app.services.question_bank import question_bank
 from app.vectorstore.retriever import retrieve_context
 from app.llm.ollama_client import get_ollama_llm
+from app.llm.prompts import REVISION_PROMPT
+from app.llm.scheduler import llm_scheduler, Priority
+from app.llm.metrics import llm_metrics
+from app.services.response_cache import response_cache, REVISION_TEMPLATE
+from app.vectorstore.chroma_client import get_embeddings
+from app.config import settings
 
 router = APIRouter()
 assessment_service = AssessmentService()
@@ -35,18 +45,45 @@ class SubmitQARequest(BaseModel):
 
 @router.post("/mcq/generate")
 async def generate_mcqs(request: MCQRequest):
-    questions = await assessment_service.generate_mcqs(request.user_id, request.topics, request.count, request.query)
+    # Serve from the pre-generated pool when possible; live generation is the fallback
+    questions = await question_bank.take(request.user_id, "MCQ", request.topics, request.count, request.query)
+    if questions is None:
+        questions = await assessment_service.generate_mcqs(request.user_id, request.topics, request.count, request.query)
+        question_bank.record_served(request.user_id, questions)
     if questions is None:
         return [] # Return empty list instead of 500
     return questions
 
 @router.post("/qa/generate")
 async def generate_qa(request: QARequest):
-    questions = await assessment_service.generate_qa(request.user_id, request.topics, request.size, request.count, request.query)
+    questions = await question_bank.take(request.user_id, "QA", request.topics, request.count, request.query, request.size)
+    if questions is None:
+        questions = await assessment_service.generate_qa(request.user_id, request.topics, request.size, request.count, request.query)
+        question_bank.record_served(request.user_id, questions)
     if questions is None:
         return [] # Return empty list instead of 500
     return questions
 
+async def _question_events(questions):
+    count = 0
+    try:
+        async for q in questions:
+            count += 1
+            yield f"event: question\ndata: {json.dumps(q)}\n\n"
+    except Exception as e:
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    yield f"event: done\ndata: {json.dumps({'count': count})}\n\n"
+
+@router.post("/mcq/generate/stream")
+async def stream_mcqs(request: MCQRequest):
+    questions = assessment_service.stream_questions(request.user_id, "MCQ", request.topics, request.count, request.query)
+    return StreamingResponse(_question_events(questions), media_type="text/event-stream")
+
+@router.post("/qa/generate/stream")
+async def stream_qa(request: QARequest):
+    questions = assessment_service.stream_questions(request.user_id, "QA", request.topics, request.count, request.query, request.size)
+    return StreamingResponse(_question_events(questions), media_type="text/event-stream")
+
 class SubmitMCQRequest(BaseModel):
     user_id: str
     question_id: str
@@ -69,12 +106,7 @@ async def submit_mcq(request: SubmitMCQRequest):
 
 @router.post("/mcq/batch-submit")
 async def batch_submit_mcq(request: BatchSubmitMCQRequest):
-    results = {}
-    for q_id, opt in request.answers.items():
-        res = await assessment_service.grade_mcq(request.user_id, q_id, opt)
-        if res:
-            results[q_id] = res
-    return results
+    return await assessment_service.grade_mcq_batch(request.user_id, request.answers)
 
 class BatchSubmitQARequest(BaseModel):
     user_id: str
@@ -93,16 +125,7 @@ async def submit_qa(request: SubmitQARequest):
 
 @router.post("/qa/batch-submit")
 async def batch_submit_qa(request: BatchSubmitQARequest):
-    results = {}
-    for q_id, ans in request.answers.items():
-        res = await assessment_service.grade_answer(
-            user_id=request.user_id,
-            user_answer=ans,
-            question_id=q_id
-        )
-        if res:
-            results[q_id] = res
-    return results
+    return await assessment_service.grade_answer_batch(request.user_id, request.answers)
 
 @router.post("/grade")
 async def grade_answer(request: GradeRequest):
@@ -124,9 +147,24 @@ class RevisionRequest(BaseModel):
 @router.post("/revision")
 async def generate_revision(request: RevisionRequest):
     # Retrieve context for these topics and summarize/explain them
-    context = await retrieve_context(" ".join(request.topics))
-    llm = get_ollama_llm(temperature=0.8)
-    prompt = f"Explain the following topics in detail to help a student revise. Focus on areas where they might be weak. Topics: {request.topics}. Context: {context}"
-    response = await llm.ainvoke(prompt)
+    query = " ".join(request.topics)
+    context = await retrieve_context(query)
+
+    embedding = None
+    if settings.RESPONSE_CACHE_ENABLED:
+        embedding = await get_embeddings().aembed_query(query)
+        cached = response_cache.lookup(REVISION_TEMPLATE, context, "-", embedding)
+        if cached:
+            return {"revision_material": cached}
+
+    llm = get_ollama_llm("revision", temperature=0.8)
+    prompt = REVISION_PROMPT.format(topics=request.topics, context=context)
+    async with llm_scheduler.slot(Priority.ASSESSMENT, request.user_id):
+        started = time.perf_counter()
+        response = await llm.ainvoke(prompt)
+        latency = time.perf_counter() - started
+    llm_metrics.record("revision", response.response_metadata, latency=latency)
     content = response.content if hasattr(response, 'content') else str(response)
+    if embedding is not None:
+        response_cache.store(REVISION_TEMPLATE, context, "-", embedding, content)
     return {"revision_material": content}
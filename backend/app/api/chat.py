@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+import asyncio
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
@@ -41,6 +42,19 @@ async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/history/{user_id}")
-async def get_user_history(user_id: str):
-    from app.memory.history import get_all_sessions
-    return get_all_sessions(user_id)
+async def get_user_history(user_id: str, cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    # Session summaries only; open a session to load its messages
+    from app.memory.history import list_sessions
+    try:
+        sessions, next_cursor = await asyncio.to_thread(list_sessions, user_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"sessions": sessions, "next_cursor": next_cursor}
+
+@router.get("/history/{user_id}/{session_id}")
+async def get_user_session(user_id: str, session_id: str):
+    from app.memory.history import load_session
+    session = await asyncio.to_thread(load_session, user_id, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
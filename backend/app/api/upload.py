@@ -1,6 +1,7 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Query
 from app.services.file_service import file_service
-from typing import Dict
+from app.vectorstore.upload_index import upload_index
+from app.config import settings
 
 import logging
 
@@ -8,10 +9,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Temporary storage for extracted content: {user_id: {filename: content}}
-# In a production app, this should be in Redis or a database with TTL
-uploaded_content_store: Dict[str, Dict[str, str]] = {}
-
 @router.post("/upload")
 async def upload_file(user_id: str = Query(...), file: UploadFile = File(...)):
     logger.info(f"Received upload request for user_id: {user_id}, filename: {file.filename}")
@@ -30,15 +27,15 @@ async def upload_file(user_id: str = Query(...), file: UploadFile = File(...)):
         
         logger.info(f"Successfully extracted {len(extracted_text)} characters from {file.filename}")
         
-        if user_id not in uploaded_content_store:
-            uploaded_content_store[user_id] = {}
-        
-        uploaded_content_store[user_id][file.filename] = extracted_text
+        # Chunk and embed once so each turn only pulls the relevant parts into the prompt
+        chunk_count = await upload_index.add_file(user_id, file.filename, extracted_text)
+        logger.info(f"Indexed {chunk_count} chunks from {file.filename} for user {user_id}")
         
         return {
             "filename": file.filename,
             "message": "File uploaded and processed successfully",
-            "content_length": len(extracted_text)
+            "content_length": len(extracted_text),
+            "chunks": chunk_count
         }
     except HTTPException:
         raise
@@ -46,13 +43,11 @@ async def upload_file(user_id: str = Query(...), file: UploadFile = File(...)):
         logger.error(f"Unexpected error during upload: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-def get_user_uploaded_content(user_id: str) -> str:
-    if user_id not in uploaded_content_store:
+async def get_user_uploaded_content(user_id: str, query: str, k: int = None) -> str:
+    # Top-k chunks of this user's uploaded files that are relevant to the query
+    if not upload_index.has_uploads(user_id):
         return ""
-    
-    # Combine all uploaded files for this user
-    return "\n\n".join(uploaded_content_store[user_id].values())
+    return await upload_index.retrieve(user_id, query, k=k or settings.UPLOAD_TOP_K)
 
 def clear_user_uploaded_content(user_id: str):
-    if user_id in uploaded_content_store:
-        del uploaded_content_store[user_id]
+    upload_index.clear(user_id)
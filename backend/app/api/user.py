@@ -1,6 +1,7 @@
 import os
 from fastapi import APIRouter, HTTPException
-from app.memory.user_profile import load_user_profile, UserProfile, save_user_profile
+from app.memory.user_profile import UserProfile
+from app.memory.user_state import user_state
 from app.services.tutor_service import tutor_service
 from app.config import settings
 
@@ -8,7 +9,7 @@ router = APIRouter()
 
 @router.get("/user/{user_id}/profile", response_model=UserProfile)
 async def get_profile(user_id: str):
-    return load_user_profile(user_id)
+    return await user_state.get(user_id)
 
 @router.post("/user/{user_id}/reset")
 async def reset_memory(user_id: str):
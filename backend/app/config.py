@@ -1,16 +1,105 @@
 import os
+import json
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Output token limit per LLM task unless MODEL_ROUTES says otherwise
+TASK_MAX_TOKENS = {
+    "chat": 1024,
+    "stream": 1024,
+    "revision": 2048,
+    "mcq_gen": 2048,
+    "qa_gen": 2048,
+    "grade": 512,
+    "gap_detect": 1024,
+    "summarize": 512,
+}
+
 class Settings(BaseSettings):
     MODEL_NAME: str = os.getenv("MODEL_NAME", "llama3.2:1b")
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    OLLAMA_MAX_CONNECTIONS: int = int(os.getenv("OLLAMA_MAX_CONNECTIONS", 20))
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", 10))
+    OLLAMA_KEEPALIVE_EXPIRY: float = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", 60))
+    OLLAMA_TIMEOUT: float = float(os.getenv("OLLAMA_TIMEOUT", 120))
+    OLLAMA_CONNECT_TIMEOUT: float = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 5))
+    # How long Ollama keeps the model loaded between requests
+    OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "5m")
     CHROMA_PATH: str = os.getenv("CHROMA_PATH", "./data/chroma")
     USER_DATA_PATH: str = os.getenv("USER_DATA_PATH", "./data/users")
+    # sqlite (profiles.sqlite3 under USER_DATA_PATH, safe with several API workers) or json
+    # (one file per user, single worker only)
+    PROFILE_BACKEND: str = os.getenv("PROFILE_BACKEND", "sqlite")
+    # Longest a changed profile may wait in memory before it is written back, and how
+    # often a cached one is checked for changes made by other workers
+    PROFILE_FLUSH_INTERVAL: float = float(os.getenv("PROFILE_FLUSH_INTERVAL", 2.0))
+    PROFILE_CACHE_MAX_USERS: int = int(os.getenv("PROFILE_CACHE_MAX_USERS", 1000))
     MEMORY_LIMIT: int = int(os.getenv("MEMORY_LIMIT", 10))
+    # Conversation windows kept in memory; idle or least recently used ones are rebuilt from the session log
+    CONVERSATION_MAX_USERS: int = int(os.getenv("CONVERSATION_MAX_USERS", 1000))
+    CONVERSATION_IDLE_TTL: float = float(os.getenv("CONVERSATION_IDLE_TTL", 1800))
+    # Turns that slide out of the MEMORY_LIMIT window are folded into the user's summary
+    SUMMARY_ENABLED: bool = os.getenv("SUMMARY_ENABLED", "true").lower() == "true"
+    SUMMARY_BATCH_TURNS: int = int(os.getenv("SUMMARY_BATCH_TURNS", 4))
+    SUMMARY_INPUT_TOKENS: int = int(os.getenv("SUMMARY_INPUT_TOKENS", 1500))
+    SUMMARY_MAX_TOKENS: int = int(os.getenv("SUMMARY_MAX_TOKENS", 300))
+    # Session log records appended before they are compacted into the snapshot
+    HISTORY_COMPACT_EVERY: int = int(os.getenv("HISTORY_COMPACT_EVERY", 50))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", 2))
+    GAP_BATCH_TURNS: int = int(os.getenv("GAP_BATCH_TURNS", 4))
+    GAP_BATCH_IDLE_SECONDS: float = float(os.getenv("GAP_BATCH_IDLE_SECONDS", 60))
+    QUESTION_BANK_ENABLED: bool = os.getenv("QUESTION_BANK_ENABLED", "true").lower() == "true"
+    QUESTION_BANK_LOW_WATER: int = int(os.getenv("QUESTION_BANK_LOW_WATER", 5))
+    QUESTION_BANK_TARGET: int = int(os.getenv("QUESTION_BANK_TARGET", 15))
+    QUESTION_BANK_BATCH_SIZE: int = int(os.getenv("QUESTION_BANK_BATCH_SIZE", 5))
+    # Only warm-listed topics and keys requested this many times are refilled in the background
+    QUESTION_BANK_MIN_DEMAND: int = int(os.getenv("QUESTION_BANK_MIN_DEMAND", 2))
+    QUESTION_BANK_MAX_POOLS: int = int(os.getenv("QUESTION_BANK_MAX_POOLS", 256))
+    QUESTION_BANK_MAX_USERS: int = int(os.getenv("QUESTION_BANK_MAX_USERS", 1000))
+    QUESTION_BANK_IDLE_TTL: float = float(os.getenv("QUESTION_BANK_IDLE_TTL", 86400))
+    # Comma-separated topics whose pools are filled at startup
+    QUESTION_BANK_TOPICS: str = os.getenv("QUESTION_BANK_TOPICS", "")
+    # Pass per-task JSON schemas to Ollama's structured output instead of free-text JSON
+    STRUCTURED_OUTPUT_ENABLED: bool = os.getenv("STRUCTURED_OUTPUT_ENABLED", "true").lower() == "true"
+    # sqlite (shared by all workers, survives restarts) or memory (per process)
+    QUESTION_STORE_BACKEND: str = os.getenv("QUESTION_STORE_BACKEND", "sqlite")
+    QUESTION_STORE_PATH: str = os.getenv("QUESTION_STORE_PATH", "./data/questions.sqlite3")
+    QUESTION_STORE_TTL: float = float(os.getenv("QUESTION_STORE_TTL", 604800))
+    QUESTION_STORE_MAX_ENTRIES: int = int(os.getenv("QUESTION_STORE_MAX_ENTRIES", 100000))
+    GRADING_CONCURRENCY: int = int(os.getenv("GRADING_CONCURRENCY", 4))
+    # Cached grading results; 0 disables the cache
+    GRADING_CACHE_SIZE: int = int(os.getenv("GRADING_CACHE_SIZE", 2048))
+    GRADING_CACHE_TTL: int = int(os.getenv("GRADING_CACHE_TTL", 86400))
+    # Every Ollama slot allocates KV cache for the full window. The study system prompt is ~1.2k
+    # estimated tokens, so with a 1024-token answer reserved it only fits once this is raised to
+    # 4096 (about twice the KV memory per slot); StudyAgent warns at startup while it does not fit
+    NUM_CTX: int = int(os.getenv("NUM_CTX", 2048))
+    # Upper bound on prompt tokens per chat turn; the routed num_predict is always reserved on top
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET", 3072))
+    # The word-level estimate undercounts BPE tokens on subword-heavy text; budgets are divided by this
+    PROMPT_TOKEN_SAFETY_FACTOR: float = float(os.getenv("PROMPT_TOKEN_SAFETY_FACTOR", 1.3))
+    # Per-task model routing as JSON, e.g. {"gap_detect": {"model": "qwen2.5:0.5b", "num_ctx": 4096, "max_tokens": 512}}
+    # Missing tasks or fields fall back to MODEL_NAME, NUM_CTX and TASK_MAX_TOKENS
+    MODEL_ROUTES: dict = json.loads(os.getenv("MODEL_ROUTES", "{}"))
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", 1024))
+    EMBEDDING_CACHE_DISK_SIZE: int = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", 50000))
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "./data/cache/embeddings.sqlite3")
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "hybrid")  # vector | lexical | hybrid
+    VECTOR_SEARCH_TIMEOUT: float = float(os.getenv("VECTOR_SEARCH_TIMEOUT", 10))
+    UPLOAD_TTL: int = int(os.getenv("UPLOAD_TTL", 7200))
+    UPLOAD_TOP_K: int = int(os.getenv("UPLOAD_TOP_K", 3))
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+    RESPONSE_CACHE_THRESHOLD: float = float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.95))
+    RESPONSE_CACHE_TTL: int = int(os.getenv("RESPONSE_CACHE_TTL", 3600))
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", 512))
+
+    def route(self, task: str) -> dict:
+        route = {"model": self.MODEL_NAME, "num_ctx": self.NUM_CTX, "max_tokens": TASK_MAX_TOKENS.get(task, 2048)}
+        route.update(self.MODEL_ROUTES.get(task, {}))
+        return route
 
     class Config:
         env_file = ".env"
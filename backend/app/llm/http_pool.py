@@ -0,0 +1,88 @@
+import weakref
+import threading
+import httpx
+from app.config import settings
+
+class ConnectionStats:
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self._known = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def observe(self, pool):
+        # Count every connection object the pool has ever handed out
+        with self._lock:
+            self.requests += 1
+            for connection in pool.connections:
+                if connection not in self._known:
+                    self._known.add(connection)
+                    self.connections_opened += 1
+
+    def to_dict(self, pool) -> dict:
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "open_connections": len(pool.connections),
+            "reuse_rate": round(reused / self.requests, 4) if self.requests else 0.0,
+        }
+
+class CountingAsyncTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = ConnectionStats()
+
+    async def handle_async_request(self, request):
+        response = await super().handle_async_request(request)
+        self.stats.observe(self._pool)
+        return response
+
+class CountingTransport(httpx.HTTPTransport):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = ConnectionStats()
+
+    def handle_request(self, request):
+        response = super().handle_request(request)
+        self.stats.observe(self._pool)
+        return response
+
+def _limits():
+    return httpx.Limits(
+        max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY
+    )
+
+def get_timeout():
+    return httpx.Timeout(settings.OLLAMA_TIMEOUT, connect=settings.OLLAMA_CONNECT_TIMEOUT)
+
+# One pool per I/O style, shared by every Ollama client in the process
+_async_transport = CountingAsyncTransport(limits=_limits())
+_sync_transport = CountingTransport(limits=_limits())
+_async_client = None
+
+def ollama_client_kwargs() -> dict:
+    # Fresh dicts each time: langchain-ollama merges auth headers into them in place
+    return {
+        "sync_client_kwargs": {"transport": _sync_transport, "timeout": get_timeout()},
+        "async_client_kwargs": {"transport": _async_transport, "timeout": get_timeout()},
+    }
+
+def get_async_http_client() -> httpx.AsyncClient:
+    # For direct calls such as the /health probe
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            base_url=settings.OLLAMA_BASE_URL,
+            transport=_async_transport,
+            timeout=get_timeout()
+        )
+    return _async_client
+
+def get_pool_stats() -> dict:
+    return {
+        "async": _async_transport.stats.to_dict(_async_transport._pool),
+        "sync": _sync_transport.stats.to_dict(_sync_transport._pool),
+    }
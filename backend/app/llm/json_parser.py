@@ -0,0 +1,177 @@
+import re
+import json
+import bisect
+import logging
+
+logger = logging.getLogger(__name__)
+
+def strip_trailing_commas(text: str):
+    """``text`` without commas that directly precede a closing brace or bracket.
+
+    String literals are left alone. Returns the repaired text and the original
+    positions of the removed commas, so offsets can be mapped back.
+    """
+    out, removed = [], []
+    in_string = escaped = False
+    pending = None  # (position in out, position in text) of the last comma outside a string
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            pending = None
+        elif char == ",":
+            pending = (len(out), i)
+        elif char in "}]":
+            if pending is not None:
+                del out[pending[0]]
+                removed.append(pending[1])
+            pending = None
+        elif not char.isspace():
+            pending = None
+        out.append(char)
+    return "".join(out), removed
+
+class IncrementalObjectParser:
+    """Pulls complete JSON objects out of a token stream as soon as they close.
+
+    Works for a top-level list of objects (``[{...}, {...}]``) as well as bare
+    objects separated by chatter, which is what small models tend to produce.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._capturing = False
+
+    def feed(self, chunk: str) -> list:
+        objects = []
+        for char in chunk:
+            if self._capturing:
+                self._buffer.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = self._capturing
+            elif char == "{":
+                if not self._capturing:
+                    self._capturing = True
+                    self._buffer = ["{"]
+                self._depth += 1
+            elif char == "}" and self._capturing:
+                self._depth -= 1
+                if self._depth == 0:
+                    obj = self._decode("".join(self._buffer))
+                    if obj is not None:
+                        objects.append(obj)
+                    self._capturing = False
+                    self._buffer = []
+        return objects
+
+    def _decode(self, text: str):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+        try:
+            return json.loads(strip_trailing_commas(text)[0])
+        except json.JSONDecodeError:
+            logger.debug(f"Skipping malformed streamed object: {text[:200]}")
+            return None
+
+_decoder = json.JSONDecoder()
+_START_CHARS = re.compile(r"[\[{]")
+
+def extract_json_values(text: str) -> list:
+    """Every well-formed top-level JSON object or array in ``text``, in one pass.
+
+    Code fences and chatter around the JSON are skipped. A value that fails
+    to decode is retried once with trailing commas removed. When a list
+    still fails (e.g. the model hit its token limit) scanning resumes inside
+    it, so complete inner objects are still found.
+    """
+    if not isinstance(text, str):
+        text = text.content if hasattr(text, "content") else str(text)
+
+    values = []
+    repaired = None
+    match = _START_CHARS.search(text)
+    while match:
+        try:
+            value, end = _decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError as e:
+            if repaired is None:
+                repaired = strip_trailing_commas(text)
+            decoded = _decode_repaired(repaired, match.start())
+            if decoded is not None:
+                value, end = decoded
+                values.append(value)
+                match = _START_CHARS.search(text, end)
+                continue
+            # Look inside a broken list for complete objects, but skip past a broken
+            # object so its nested dicts are not mistaken for top-level ones
+            resume = match.start() + 1 if text[match.start()] == "[" else max(e.pos, match.start() + 1)
+            match = _START_CHARS.search(text, resume)
+            continue
+        values.append(value)
+        match = _START_CHARS.search(text, end)
+    return values
+
+def _decode_repaired(repaired, start: int):
+    # Decode at an original offset in the comma-stripped text and map the end back
+    text, removed = repaired
+    if not removed:
+        return None
+    shift = bisect.bisect_left(removed, start)
+    try:
+        value, end = _decoder.raw_decode(text, start - shift)
+    except json.JSONDecodeError:
+        return None
+    # Every removed comma before the decoded end lies inside the value
+    original_end = end + shift
+    for position in removed[shift:]:
+        if position >= original_end:
+            break
+        original_end += 1
+    return value, original_end
+
+def parse_json_object(text: str):
+    # First JSON object in the text, e.g. a grading result
+    for value in extract_json_values(text):
+        if isinstance(value, dict):
+            return value
+        if isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    return item
+    return None
+
+def parse_json_list(text: str):
+    # All JSON objects in the text as one list, whether the model returned a
+    # list, several bare objects, or a single object wrapping the list
+    items = []
+    for value in extract_json_values(text):
+        if isinstance(value, list):
+            items.extend(v for v in value if isinstance(v, dict))
+        elif isinstance(value, dict):
+            nested = [v for v in value.values() if isinstance(v, list) and v and all(isinstance(i, dict) for i in v)]
+            if len(value) == 1 and len(nested) == 1:
+                items.extend(nested[0])
+            else:
+                items.append(value)
+    return items or None
@@ -0,0 +1,82 @@
+import logging
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+NANOSECONDS = 1_000_000_000
+
+class TaskMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens_estimated = 0
+        self.prompt_eval_tokens = 0
+        self.prompt_eval_seconds = 0.0
+        self.eval_tokens = 0
+        self.eval_seconds = 0.0
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+        self.timed_calls = 0
+        self.first_token_seconds = 0.0
+        self.first_token_calls = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "avg_latency_ms": round(self.latency_seconds * 1000 / self.timed_calls, 1) if self.timed_calls else 0.0,
+            "max_latency_ms": round(self.max_latency_seconds * 1000, 1),
+            "avg_first_token_ms": round(self.first_token_seconds * 1000 / self.first_token_calls, 1) if self.first_token_calls else 0.0,
+            "prompt_tokens_estimated": self.prompt_tokens_estimated,
+            "prompt_eval_tokens": self.prompt_eval_tokens,
+            "prompt_eval_ms": round(self.prompt_eval_seconds * 1000, 1),
+            "avg_prompt_eval_ms": round(self.prompt_eval_seconds * 1000 / self.calls, 1) if self.calls else 0.0,
+            "eval_tokens": self.eval_tokens,
+            "eval_ms": round(self.eval_seconds * 1000, 1),
+            "eval_tokens_per_second": round(self.eval_tokens / self.eval_seconds, 1) if self.eval_seconds else 0.0,
+        }
+
+class LLMMetrics:
+    """Aggregates wall-clock latency and Ollama's per-response timing metadata by task."""
+
+    def __init__(self):
+        self._tasks = {}
+
+    def record(self, task: str, response_metadata: dict, prompt_tokens_estimated: int = None,
+               latency: float = None, first_token_latency: float = None):
+        has_counts = response_metadata and ("prompt_eval_count" in response_metadata or "eval_count" in response_metadata)
+        if not has_counts and latency is None:
+            return
+        response_metadata = response_metadata or {}
+        metrics = self._tasks.setdefault(task, TaskMetrics())
+        prompt_eval_count = response_metadata.get("prompt_eval_count") or 0
+        prompt_eval_seconds = (response_metadata.get("prompt_eval_duration") or 0) / NANOSECONDS
+        metrics.calls += 1
+        metrics.prompt_eval_tokens += prompt_eval_count
+        metrics.prompt_eval_seconds += prompt_eval_seconds
+        metrics.eval_tokens += response_metadata.get("eval_count") or 0
+        metrics.eval_seconds += (response_metadata.get("eval_duration") or 0) / NANOSECONDS
+        if latency is not None:
+            metrics.timed_calls += 1
+            metrics.latency_seconds += latency
+            metrics.max_latency_seconds = max(metrics.max_latency_seconds, latency)
+        if first_token_latency is not None:
+            metrics.first_token_calls += 1
+            metrics.first_token_seconds += first_token_latency
+
+        message = f"{task}: prompt eval {prompt_eval_count} tokens in {prompt_eval_seconds * 1000:.0f}ms"
+        if latency is not None:
+            message += f", {latency * 1000:.0f}ms total"
+        if prompt_tokens_estimated:
+            # A word-level estimate, not BPE tokens: kept next to Ollama's count
+            # but never subtracted from it. Prefix reuse shows up as a falling
+            # prompt_eval_count for the same conversation.
+            metrics.prompt_tokens_estimated += prompt_tokens_estimated
+        logger.info(message)
+
+    def get_stats(self) -> dict:
+        # The routed model sits next to its numbers so routes can be tuned from them
+        return {
+            task: {"model": settings.route(task)["model"], **metrics.to_dict()}
+            for task, metrics in self._tasks.items()
+        }
+
+llm_metrics = LLMMetrics()
@@ -1,18 +1,22 @@
 from langchain_ollama import ChatOllama
 from app.config import settings
+from app.llm.http_pool import ollama_client_kwargs
 from functools import lru_cache
 
 @lru_cache()
-def get_ollama_llm(temperature: float = 0.7, max_tokens: int = 2048):
+def get_ollama_llm(task: str = "chat", temperature: float = 0.7):
+    # Model, context window and output limit come from the task's route in settings
+    route = settings.route(task)
     return ChatOllama(
-        model=settings.MODEL_NAME,
+        model=route["model"],
         base_url=settings.OLLAMA_BASE_URL,
         temperature=temperature,
-        num_predict=max_tokens,
-        num_ctx=2048,  # Reduced context window for speed
+        num_predict=route["max_tokens"],
+        num_ctx=route["num_ctx"],
         repeat_penalty=1.1,
         top_k=40,      # More standard sampling
         top_p=0.9,     # More standard sampling
-        keep_alive="5m", # Keep model in memory for 5 minutes
-        timeout=120,    # Increased timeout for slower local models
+        keep_alive=settings.OLLAMA_KEEP_ALIVE, # Keep model in memory between requests
+        # Shared keep-alive connection pool; timeouts are set on the transport
+        **ollama_client_kwargs()
     )
@@ -0,0 +1,127 @@
+import re
+import json
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Words and individual punctuation marks; close enough to a BPE count for budgeting
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+PLACEHOLDER_PATTERN = re.compile(r"(?<!\{)\{[a-z_]+\}(?!\})")
+
+def estimate_tokens(text: str) -> int:
+    return len(TOKEN_PATTERN.findall(text or ""))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    matches = list(TOKEN_PATTERN.finditer(text))
+    if len(matches) <= max_tokens:
+        return text
+    return text[:matches[max_tokens - 1].end()] + " ..."
+
+class PromptBudget:
+    """Fits the variable prompt sections into a token budget.
+
+    The system template and the user's input are always kept. The remaining
+    budget goes, in priority order, to retrieved context, recent history,
+    the learning summary and finally the profile, each of which is trimmed or
+    compressed to whatever is left.
+
+    ``budget`` is in model (BPE) tokens. Sections are measured with the
+    word-level estimate, which undercounts BPE, so they are fitted into
+    ``budget / safety_factor`` estimated tokens.
+    """
+
+    def __init__(self, budget: int, safety_factor: float = 1.0):
+        self.budget = budget
+        self.safety_factor = safety_factor
+
+    @property
+    def estimated_budget(self) -> int:
+        return int(self.budget / self.safety_factor)
+
+    def fit(self, template: str, input_text: str, history: list, context: str,
+            summary: Optional[str] = None, profile=None) -> Tuple[dict, Dict[str, Tuple[int, int]]]:
+        report: Dict[str, Tuple[int, int]] = {}
+        static_tokens = estimate_tokens(PLACEHOLDER_PATTERN.sub("", template))
+        input_tokens = estimate_tokens(input_text)
+        report["system"] = (static_tokens, 0)
+        report["input"] = (input_tokens, 0)
+        remaining = self.estimated_budget - static_tokens - input_tokens
+
+        params = {"input": input_text}
+        params["context"], remaining = self._fit_context(context, remaining, report)
+        params["history"], remaining = self._fit_history(history, remaining, report)
+        if summary is not None:
+            params["summary"], remaining = self._fit_text("summary", summary, remaining, report)
+        if profile is not None:
+            profile_params, remaining = self._fit_profile(profile, remaining, report)
+            params.update(profile_params)
+        return params, report
+
+    def _fit_text(self, name: str, text: str, remaining: int, report) -> Tuple[str, int]:
+        tokens = estimate_tokens(text)
+        kept = truncate_to_tokens(text, max(remaining, 0)) if tokens > remaining else text
+        used = min(tokens, max(remaining, 0))
+        report[name] = (used, tokens - used)
+        return kept, remaining - used
+
+    def _fit_context(self, context: str, remaining: int, report) -> Tuple[str, int]:
+        # Retrieval returns chunks joined by blank lines, ranked best first; keep whole chunks
+        chunks = [c for c in (context or "").split("\n\n") if c.strip()]
+        total = sum(estimate_tokens(c) for c in chunks)
+        kept, used = [], 0
+        for chunk in chunks:
+            tokens = estimate_tokens(chunk)
+            if used + tokens > remaining:
+                if not kept:
+                    kept.append(truncate_to_tokens(chunk, remaining))
+                    used = max(remaining, 0)
+                break
+            kept.append(chunk)
+            used += tokens
+        report["context"] = (used, total - used)
+        return "\n\n".join(kept), remaining - used
+
+    def _fit_history(self, history: list, remaining: int, report) -> Tuple[list, int]:
+        # Drop the oldest turns first
+        kept, used = [], 0
+        total = sum(estimate_tokens(m.content) for m in history)
+        for message in reversed(history):
+            tokens = estimate_tokens(message.content)
+            if used + tokens > remaining:
+                break
+            kept.insert(0, message)
+            used += tokens
+        report["history"] = (used, total - used)
+        return kept, remaining - used
+
+    def _fit_profile(self, profile, remaining: int, report) -> Tuple[dict, int]:
+        full_mastery = json.dumps({k: v.model_dump() for k, v in profile.topics.items()}, default=str)
+        params = {
+            "knowledge_level": profile.knowledge_level,
+            "known_concepts": ", ".join(profile.known_concepts),
+            "weak_areas": ", ".join(profile.weak_areas),
+            "explanation_preference": profile.explanation_preference,
+            "topic_mastery": full_mastery,
+        }
+        total = sum(estimate_tokens(v) for v in params.values())
+        if total > remaining:
+            # Compress: only the mastery value is needed per topic, not ids and timestamps
+            params["topic_mastery"] = json.dumps({k: round(v.mastery, 2) for k, v in profile.topics.items()})
+        for key in ("topic_mastery", "known_concepts", "weak_areas"):
+            used = sum(estimate_tokens(v) for v in params.values())
+            if used <= remaining:
+                break
+            other = used - estimate_tokens(params[key])
+            params[key] = truncate_to_tokens(params[key], max(remaining - other, 0))
+        used = sum(estimate_tokens(v) for v in params.values())
+        report["profile"] = (used, max(total - used, 0))
+        return params, remaining - used
+
+def log_budget_report(user_id: str, budget: int, report: Dict[str, Tuple[int, int]]):
+    used = sum(u for u, _ in report.values())
+    dropped = sum(d for _, d in report.values())
+    sections = ", ".join(f"{name}={u}/-{d}" for name, (u, d) in report.items())
+    logger.info(f"Prompt budget for {user_id}: {used}/{budget} tokens used, {dropped} dropped ({sections})")
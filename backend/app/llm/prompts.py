@@ -177,8 +177,14 @@ This prompt is a binding contract.
 If you cannot follow it exactly, you must refuse to act and explain which rule is violated.
 
 Do not improvise. Do not estimate. Do not guess.
+"""
 
-CURRENT SESSION STATE:
+# Everything per-user and per-turn goes into the final human turn so that the
+# rules above, and then the conversation so far, form a byte-identical prefix
+# that Ollama can reuse from its prompt cache instead of re-evaluating. It must
+# not be a second system message: chat templates such as llama3.2's merge every
+# system message into one block rendered before the history.
+SESSION_STATE_PROMPT = """CURRENT SESSION STATE:
 Profile:
 - Level: {knowledge_level}, Known: {known_concepts}, Weak: {weak_areas}, Preference: {explanation_preference}
 - Topic Mastery: {topic_mastery}
@@ -191,7 +197,7 @@ def get_study_prompt():
     return ChatPromptTemplate.from_messages([
         ("system", SYSTEM_PROMPT),
         MessagesPlaceholder(variable_name="history"),
-        ("human", "{input}"),
+        ("human", SESSION_STATE_PROMPT + "\nStudent: {input}"),
     ])
 
 FILE_STUDY_PROMPT = """You are Study Buddy Agent. You are currently in "File Analysis Mode".
@@ -201,8 +207,9 @@ CORE RULES for File Analysis Mode:
 2. If the answer is not available in the provided context, you MUST say: "The answer is not available in your uploaded file."
 3. Do not use any outside knowledge or information from previous study materials unless it is also present in the uploaded file.
 4. Maintain a helpful and academic tone.
+"""
 
-UPLOADED FILE CONTENT:
+FILE_CONTEXT_PROMPT = """UPLOADED FILE CONTENT:
 {context}
 """
 
@@ -210,7 +217,7 @@ def get_file_study_prompt():
     return ChatPromptTemplate.from_messages([
         ("system", FILE_STUDY_PROMPT),
         MessagesPlaceholder(variable_name="history"),
-        ("human", "{input}"),
+        ("human", FILE_CONTEXT_PROMPT + "\nStudent: {input}"),
     ])
 
 GAP_DETECTOR_PROMPT = """Analyze the following user message and conversation history to detect learning gaps, confusion, or mastered concepts.
@@ -226,6 +233,19 @@ User Message: {input}
 History: {history}
 """
 
+GAP_DETECTOR_BATCH_PROMPT = """Analyze the following {count} conversation turns to detect learning gaps, confusion, or mastered concepts.
+Analyze each turn separately, in order, taking the earlier turns into account as history.
+Identify specific topics being discussed and the user's mastery level for each (0.0 to 1.0).
+
+Return a JSON list with exactly {count} objects, one per turn, each with:
+- "new_concepts": List of concepts the user seems to understand now.
+- "weak_areas": List of areas where the user shows confusion or gaps.
+- "confidence_delta": A float between -0.1 and 0.1 indicating progress.
+- "topic_mastery_updates": Dictionary of {{"topic_name": mastery_increment_or_decrement}} where value is between -0.2 and 0.2.
+
+{turns}
+"""
+
 MCQ_GENERATION_PROMPT = """Generate {count} multiple-choice questions based EXCLUSIVELY on the following topic/query: {topics}.
 
 CRITICAL REQUIREMENTS:
@@ -290,3 +310,16 @@ Return a JSON object with:
 - "total_score": float (0-10)
 - "feedback": Brief explanation of the grade.
 """
+
+REVISION_PROMPT = "Explain the following topics in detail to help a student revise. Focus on areas where they might be weak. Topics: {topics}. Context: {context}"
+
+SUMMARY_PROMPT = """You maintain a running summary of a student's study sessions with a tutor.
+Update the summary below with the new conversation turns. Keep what still matters from the existing summary:
+topics covered, what the student understood, where they struggled and any preferences they stated.
+Drop small talk and details that no longer matter. Write plain prose in at most {max_words} words and return only the summary.
+
+Existing summary: {summary}
+
+New turns:
+{turns}
+"""
@@ -0,0 +1,133 @@
+import time
+import asyncio
+import logging
+from enum import IntEnum
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    ASSESSMENT = 1
+    BACKGROUND = 2
+
+class PriorityStats:
+    def __init__(self):
+        self.served = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, wait: float):
+        self.served += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+class LLMScheduler:
+    """Admission control for calls to the shared Ollama instance.
+
+    At most ``max_concurrency`` calls run at once. Waiting calls are served
+    strictly by priority class and, within a class, round-robin across users
+    so one user's burst cannot monopolise the model.
+    """
+
+    def __init__(self, max_concurrency: int = 2):
+        self.max_concurrency = max_concurrency
+        self._in_flight = 0
+        # priority -> user_id -> FIFO of waiting futures; OrderedDict order is the round-robin turn
+        self._queues = {p: OrderedDict() for p in Priority}
+        self._stats = {p: PriorityStats() for p in Priority}
+
+    def _queued(self, priority: Priority) -> int:
+        return sum(len(q) for q in self._queues[priority].values())
+
+    def _has_waiters(self) -> bool:
+        return any(self._queues[p] for p in Priority)
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, user_id: str = "anonymous"):
+        await self._acquire(priority, user_id)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: Priority, user_id: str):
+        if self._in_flight < self.max_concurrency and not self._has_waiters():
+            self._in_flight += 1
+            self._stats[priority].record_wait(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(user_id, deque()).append(future)
+        enqueued_at = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we were cancelled; pass it on
+                self._release()
+            else:
+                self._discard(priority, user_id, future)
+            raise
+
+        wait = time.monotonic() - enqueued_at
+        self._stats[priority].record_wait(wait)
+        if wait > 1.0:
+            logger.info(f"LLM call for {user_id} ({priority.name.lower()}) waited {wait:.2f}s in queue")
+
+    def _discard(self, priority: Priority, user_id: str, future):
+        users = self._queues[priority]
+        queue = users.get(user_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del users[user_id]
+
+    def _release(self):
+        self._in_flight -= 1
+        while self._in_flight < self.max_concurrency:
+            future = self._next_waiter()
+            if future is None:
+                return
+            self._in_flight += 1
+            future.set_result(None)
+
+    def _next_waiter(self):
+        for priority in Priority:
+            users = self._queues[priority]
+            while users:
+                user_id, queue = next(iter(users.items()))
+                future = queue.popleft()
+                if queue:
+                    users.move_to_end(user_id)
+                else:
+                    del users[user_id]
+                if not future.done():
+                    return future
+        return None
+
+    def get_stats(self) -> dict:
+        classes = {}
+        for p in Priority:
+            stats = self._stats[p]
+            classes[p.name.lower()] = {
+                "queued": self._queued(p),
+                "waiting_users": len(self._queues[p]),
+                "served": stats.served,
+                "avg_wait_ms": round(stats.total_wait / stats.served * 1000, 1) if stats.served else 0.0,
+                "max_wait_ms": round(stats.max_wait * 1000, 1),
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "queue_depth": sum(self._queued(p) for p in Priority),
+            "classes": classes,
+        }
+
+llm_scheduler = LLMScheduler(max_concurrency=settings.LLM_MAX_CONCURRENCY)
@@ -0,0 +1,137 @@
+import logging
+from typing import List, Dict
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
+from app.config import settings
+from app.llm.json_parser import parse_json_list, parse_json_object
+
+logger = logging.getLogger(__name__)
+
+class MCQQuestion(BaseModel):
+    question: str
+    options: List[str] = Field(min_length=4, max_length=4)
+    correct_answer: int = Field(ge=0, le=3)
+    explanation: str
+
+class QAQuestion(BaseModel):
+    question: str
+    suggested_answer_key_points: str
+
+    @field_validator("suggested_answer_key_points", mode="before")
+    @classmethod
+    def join_key_points(cls, value):
+        # Free-text answers sometimes list the key points instead of writing them out
+        if isinstance(value, list):
+            return "; ".join(str(v) for v in value)
+        return value
+
+class GradingResult(BaseModel):
+    correctness_score: float
+    completeness_score: float
+    clarity_score: float
+    total_score: float
+    feedback: str
+
+class GapAnalysis(BaseModel):
+    new_concepts: List[str]
+    weak_areas: List[str]
+    confidence_delta: float
+    topic_mastery_updates: Dict[str, float]
+
+class StructuredTask:
+    def __init__(self, model, many: bool = False):
+        self.model = model
+        self.many = many
+        self.adapter = TypeAdapter(List[model] if many else model)
+        # Item schemas are flat, so the array schema needs no $defs for Ollama to resolve
+        item_schema = model.model_json_schema()
+        self.schema = {"type": "array", "items": item_schema} if many else item_schema
+
+TASKS = {
+    "mcq_gen": StructuredTask(MCQQuestion, many=True),
+    "qa_gen": StructuredTask(QAQuestion, many=True),
+    "grade": StructuredTask(GradingResult),
+    "gap_detect": StructuredTask(GapAnalysis),
+    "gap_detect_batch": StructuredTask(GapAnalysis, many=True),
+}
+
+class ParseStats:
+    def __init__(self):
+        self.structured = 0
+        self.recovered = 0
+        self.failed = 0
+
+    def to_dict(self) -> dict:
+        calls = self.structured + self.recovered + self.failed
+        return {
+            "calls": calls,
+            "structured": self.structured,
+            "recovered": self.recovered,
+            "failed": self.failed,
+            # Responses that did not validate as returned by the model
+            "parse_failure_rate": round((self.recovered + self.failed) / calls, 4) if calls else 0.0,
+            # Responses nothing usable could be recovered from
+            "failure_rate": round(self.failed / calls, 4) if calls else 0.0,
+        }
+
+class StructuredOutput:
+    """Constrains task output to a JSON schema and validates it into Pydantic models.
+
+    With ``enabled`` the schema is passed as Ollama's ``format`` so the model
+    can only emit matching JSON. Responses that still fail validation (or all
+    responses, when disabled) go through the heuristic extractor and keep only
+    the items that validate. Outcomes are counted per task.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._stats = {}
+
+    def bind(self, llm, task: str):
+        if not self.enabled:
+            return llm
+        return llm.bind(format=TASKS[task].schema)
+
+    def record(self, task: str, outcome: str):
+        stats = self._stats.setdefault(task, ParseStats())
+        setattr(stats, outcome, getattr(stats, outcome) + 1)
+
+    def validate_item(self, task: str, obj):
+        try:
+            return TASKS[task].model.model_validate(obj).model_dump()
+        except ValidationError as e:
+            logger.debug(f"Dropping invalid {task} item: {e.error_count()} errors")
+            return None
+
+    def parse(self, task: str, content: str):
+        """Validated dicts for ``task`` (a list for list tasks), or None."""
+        spec = TASKS[task]
+        try:
+            value = spec.adapter.validate_json(content)
+            if not spec.many:
+                self.record(task, "structured")
+                return value.model_dump()
+            if value:
+                self.record(task, "structured")
+                return [item.model_dump() for item in value]
+        except ValidationError:
+            pass
+
+        if spec.many:
+            items = [self.validate_item(task, obj) for obj in parse_json_list(content) or []]
+            result = [item for item in items if item is not None] or None
+        else:
+            obj = parse_json_object(content)
+            result = self.validate_item(task, obj) if obj is not None else None
+
+        self.record(task, "recovered" if result else "failed")
+        if not result:
+            logger.warning(f"No valid {task} output in LLM response: {content[:200]}")
+        return result
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "tasks": {task: stats.to_dict() for task, stats in self._stats.items()},
+        }
+
+structured_output = StructuredOutput(enabled=settings.STRUCTURED_OUTPUT_ENABLED)
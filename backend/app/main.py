@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 import os
+import asyncio
 from app.api import chat, user, assessment, upload
 from app.utils.logger import configure_logging
 
@@ -28,26 +29,82 @@ app.include_router(upload.router, tags=["upload"])
 
 @app.get("/health")
 async def health_check():
-    import httpx
     from app.config import settings
+    from app.llm.http_pool import get_async_http_client, get_pool_stats
+    from app.vectorstore.chroma_client import get_embeddings
+    from app.services.response_cache import response_cache
+    from app.llm.scheduler import llm_scheduler
+    from app.services.question_bank import question_bank
+    from app.llm.metrics import llm_metrics
+    from app.llm.structured_output import structured_output
+    from app.services.grading_cache import grading_cache
+    from app.services.question_store import question_store
+    from app.memory.user_state import user_state
+    from app.memory.conversation import conversation_store
+    from app.services.tutor_service import tutor_service
     
     ollama_status = "unknown"
     try:
-        async with httpx.AsyncClient(timeout=2.0) as client:
-            response = await client.get(f"{settings.OLLAMA_BASE_URL}/api/tags")
-            if response.status_code == 200:
-                ollama_status = "connected"
-            else:
-                ollama_status = f"error: {response.status_code}"
+        response = await get_async_http_client().get("/api/tags", timeout=2.0)
+        if response.status_code == 200:
+            ollama_status = "connected"
+        else:
+            ollama_status = f"error: {response.status_code}"
     except Exception as e:
         ollama_status = f"unreachable: {str(e)}"
 
     return {
         "status": "healthy",
         "ollama": ollama_status,
-        "ollama_url": settings.OLLAMA_BASE_URL
+        "ollama_url": settings.OLLAMA_BASE_URL,
+        "embedding_cache": get_embeddings().get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "llm_scheduler": llm_scheduler.get_stats(),
+        "question_bank": question_bank.get_stats(),
+        "llm_metrics": llm_metrics.get_stats(),
+        "structured_output": structured_output.get_stats(),
+        "grading_cache": grading_cache.get_stats(),
+        "question_store": await asyncio.to_thread(question_store.get_stats),
+        "user_state": user_state.get_stats(),
+        "conversations": conversation_store.get_stats(),
+        "summarizer": tutor_service.summarizer.get_stats(),
+        "ollama_connections": get_pool_stats()
     }
 
+@app.on_event("startup")
+async def claim_profile_store():
+    from app.config import settings
+    from app.memory.user_state import user_state
+    user_state.claim(settings.USER_DATA_PATH)
+
+@app.on_event("startup")
+async def load_lexical_index():
+    from app.vectorstore.lexical_index import get_lexical_index
+    await asyncio.to_thread(get_lexical_index().load)
+
+@app.on_event("startup")
+async def warm_question_bank():
+    from app.config import settings
+    from app.services.question_bank import question_bank
+    topics = [t.strip() for t in settings.QUESTION_BANK_TOPICS.split(",") if t.strip()]
+    question_bank.warm(topics)
+
+@app.on_event("shutdown")
+async def flush_pending_gap_detection():
+    from app.services.tutor_service import tutor_service
+    await tutor_service.gap_batcher.flush_all()
+
+@app.on_event("shutdown")
+async def drain_summarizer():
+    from app.services.tutor_service import tutor_service
+    await tutor_service.summarizer.drain()
+
+@app.on_event("shutdown")
+async def flush_user_state():
+    # Runs after the gap detection flush above, which may still dirty profiles
+    from app.memory.user_state import user_state
+    await user_state.flush_all()
+
 # Serve static files from the frontend/dist directory
 # Path is relative to the project root in Docker
 frontend_dist_path = os.path.join(os.getcwd(), "frontend/dist")
@@ -1,15 +1,153 @@
-try:
-    from langchain.memory import ConversationBufferWindowMemory
-except ImportError:
-    from langchain_classic.memory import ConversationBufferWindowMemory
+import sys
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import List
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from app.config import settings
+from app.memory.history import get_recent_messages
 
-def get_conversation_memory(user_id: str):
-    # In a real production app, we would use a RedisChatMessageHistory or similar.
-    # For now, we'll return a memory instance. 
-    # Note: State management for multiple users needs to be handled in the service layer.
-    return ConversationBufferWindowMemory(
-        k=settings.MEMORY_LIMIT,
-        memory_key="history",
-        return_messages=True
-    )
+logger = logging.getLogger(__name__)
+
+# Size of the (role, text) tuple holding each message, on top of the text itself
+TURN_OVERHEAD_BYTES = sys.getsizeof(("user", ""))
+
+def _message_bytes(text: str) -> int:
+    return sys.getsizeof(text) + TURN_OVERHEAD_BYTES
+
+class ConversationWindow:
+    """The last ``max_messages`` messages of one user's session as plain (role, text) pairs."""
+
+    __slots__ = ("session_id", "turns", "nbytes", "last_used", "unpersisted")
+
+    def __init__(self, session_id: str, max_messages: int):
+        self.session_id = session_id
+        self.turns: deque = deque(maxlen=max_messages)
+        self.nbytes = 0
+        self.last_used = time.monotonic()
+        # Turns held here that the session log does not have yet
+        self.unpersisted = 0
+
+    def add(self, role: str, text: str):
+        if len(self.turns) == self.turns.maxlen:
+            self.nbytes -= _message_bytes(self.turns[0][1])
+        self.turns.append((role, text))
+        self.nbytes += _message_bytes(text)
+
+    def messages(self) -> List[BaseMessage]:
+        # LangChain messages are only built for the prompt, never kept
+        return [HumanMessage(content=text) if role == "user" else AIMessage(content=text) for role, text in self.turns]
+
+class ConversationStore:
+    """Bounded in-memory conversation windows for the study agent.
+
+    Windows are evicted in LRU order once more than ``max_users`` are
+    resident, and after ``idle_ttl`` seconds without use. The session log is
+    the spill: an evicted window needs no write of its own, and the next
+    request rebuilds it from the log's tail. A turn reaches the log in a
+    background task after it is added here, so a window stays resident until
+    ``persisted`` confirms each of its turns; evicting it earlier would
+    rebuild it without them.
+    """
+
+    def __init__(self, max_users: int = 1000, idle_ttl: float = 1800, window_turns: int = 10):
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self.max_messages = window_turns * 2
+        self._windows: "OrderedDict[str, ConversationWindow]" = OrderedDict()
+        self.hits = 0
+        self.rehydrations = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expire(self, now: float):
+        # Least recently used first, so stop at the first window still in use
+        for user_id, window in list(self._windows.items()):
+            if now - window.last_used < self.idle_ttl:
+                break
+            if window.unpersisted:
+                continue
+            del self._windows[user_id]
+            self.expirations += 1
+
+    def _evict(self):
+        excess = len(self._windows) - self.max_users
+        if excess <= 0:
+            return
+        # Never the most recently used window, which the caller is about to use;
+        # pinned windows may hold the store above max_users for a moment
+        for user_id, window in list(self._windows.items())[:-1]:
+            if excess <= 0:
+                break
+            if window.unpersisted:
+                continue
+            del self._windows[user_id]
+            self.evictions += 1
+            excess -= 1
+
+    async def _rehydrate(self, user_id: str, session_id: str) -> ConversationWindow:
+        window = ConversationWindow(session_id, self.max_messages)
+        try:
+            messages = await asyncio.to_thread(get_recent_messages, user_id, session_id, self.max_messages)
+        except Exception as e:
+            logger.error(f"Could not rehydrate conversation for {user_id}/{session_id}: {e}")
+            messages = []
+        for message in messages:
+            window.add(message.role, message.content)
+        self.rehydrations += 1
+        return window
+
+    async def get(self, user_id: str, session_id: str = "default") -> ConversationWindow:
+        now = time.monotonic()
+        self._expire(now)
+        window = self._windows.get(user_id)
+        if window is None or window.session_id != session_id:
+            loaded = await self._rehydrate(user_id, session_id)
+            # A concurrent request for the same session may have won the race
+            window = self._windows.get(user_id)
+            if window is None or window.session_id != session_id:
+                window = self._windows[user_id] = loaded
+        else:
+            self.hits += 1
+        window.last_used = now
+        self._windows.move_to_end(user_id)
+        self._evict()
+        return window
+
+    async def history(self, user_id: str, session_id: str = "default") -> List[BaseMessage]:
+        return (await self.get(user_id, session_id)).messages()
+
+    async def add_turn(self, user_id: str, session_id: str, input_text: str, output_text: str):
+        window = await self.get(user_id, session_id)
+        window.add("user", input_text)
+        window.add("assistant", output_text)
+        window.unpersisted += 1
+
+    def persisted(self, user_id: str, session_id: str):
+        # Called once the turn from add_turn is in the session log, or has failed to get there
+        window = self._windows.get(user_id)
+        if window is not None and window.session_id == session_id and window.unpersisted:
+            window.unpersisted -= 1
+
+    def clear(self, user_id: str):
+        self._windows.pop(user_id, None)
+
+    def get_stats(self) -> dict:
+        return {
+            "resident_users": len(self._windows),
+            "resident_bytes": sum(w.nbytes for w in self._windows.values()),
+            "unpersisted_users": sum(1 for w in self._windows.values() if w.unpersisted),
+            "max_users": self.max_users,
+            "idle_ttl_seconds": self.idle_ttl,
+            "hits": self.hits,
+            "rehydrations": self.rehydrations,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+conversation_store = ConversationStore(
+    max_users=settings.CONVERSATION_MAX_USERS,
+    idle_ttl=settings.CONVERSATION_IDLE_TTL,
+    window_turns=settings.MEMORY_LIMIT
+)
@@ -1,9 +1,13 @@
 import os
 import json
+import shutil
+import threading
+from collections import OrderedDict
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 from app.config import settings
+from app.memory.session_index import get_session_index
 
 class ChatMessage(BaseModel):
     role: str
@@ -19,28 +23,262 @@ class SessionHistory(BaseModel):
     topic_mastery: dict[str, float] = {}
     created_at: datetime = Field(default_factory=datetime.now)
 
+# Each session is an append-only log of turns ({session_id}.jsonl) on top of a
+# compacted snapshot ({session_id}.json, the same file the old full rewrites
+# produced). Records carry a sequence number and the snapshot remembers the
+# last one it contains, so a crash between compaction steps never replays a turn.
+LOG_SUFFIX = ".jsonl"
+SNAPSHOT_SUFFIX = ".json"
+TAIL_BLOCK_SIZE = 8192
+
 def get_history_path(user_id: str):
     path = os.path.join(settings.USER_DATA_PATH, "history", user_id)
     os.makedirs(path, exist_ok=True)
     return path
 
-def save_session_history(history: SessionHistory):
-    path = os.path.join(get_history_path(history.user_id), f"{history.session_id}.json")
-    with open(path, "w") as f:
-        f.write(history.model_dump_json())
+class SessionLog:
+    def __init__(self, user_id: str, session_id: str):
+        self.user_id = user_id
+        self.session_id = session_id
+        directory = get_history_path(user_id)
+        self.log_path = os.path.join(directory, session_id + LOG_SUFFIX)
+        self.snapshot_path = os.path.join(directory, session_id + SNAPSHOT_SUFFIX)
+        # Reentrant so callers can hold it across a log operation and the index update that goes with it
+        self.lock = threading.RLock()
+        self._next_seq = None
+        self._snapshot_seq = None
 
-def get_all_sessions(user_id: str) -> List[SessionHistory]:
-    path = get_history_path(user_id)
-sessions = []
-if os.path.exists(path):
-    for filename in os.listdir(path):
-        if filename.endswith(".json"):
-            with open(os.path.join(path, filename), "r") as f:
-                sessions.append(SessionHistory.model_validate_json(f.read()))
-return sorted(sessions, key=lambda x: x.created_at, reverse=True)
+    def _read_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return None, 0
+        with open(self.snapshot_path, "r") as f:
+            data = json.load(f)
+        last_seq = data.pop("last_seq", 0)
+        return SessionHistory(**data), last_seq
+
+    def _read_records(self, after_seq: int = 0):
+        if not os.path.exists(self.log_path):
+            return []
+        records = []
+        with open(self.log_path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append
+                    continue
+                if record.get("seq", 0) > after_seq:
+                    records.append(record)
+        return records
+
+    def _tail_records(self, max_records: int) -> list:
+        # Read whole lines backwards from the end of the log without scanning the rest
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            buffer = b""
+            while position > 0 and buffer.count(b"\n") <= max_records:
+                read = min(TAIL_BLOCK_SIZE, position)
+                position -= read
+                f.seek(position)
+                buffer = f.read(read) + buffer
+        lines = buffer.split(b"\n")
+        if position > 0:
+            lines = lines[1:]  # Partial first line
+        records = []
+        for line in reversed(lines):
+            if len(records) >= max_records:
+                break
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        records.reverse()
+        return records
+
+    def _repair_tail(self):
+        # Cut a torn final line left by a crash mid-append; otherwise the next
+        # record would be written onto the fragment and lost with it
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            end = position = f.tell()
+            while position > 0:
+                read = min(TAIL_BLOCK_SIZE, position)
+                position -= read
+                f.seek(position)
+                block = f.read(read)
+                newline = block.rfind(b"\n")
+                if newline != -1:
+                    position += newline + 1
+                    break
+            if position < end:
+                f.truncate(position)
+
+    def _ensure_sequence(self):
+        if self._next_seq is not None:
+            return
+        self._repair_tail()
+        _, self._snapshot_seq = self._read_snapshot()
+        tail = self._tail_records(1)
+        self._next_seq = max(self._snapshot_seq, tail[-1]["seq"] if tail else 0) + 1
+
+    def append(self, messages: List[ChatMessage], mastered_concepts: List[str], weak_areas: List[str],
+               topic_mastery: dict, created_at: Optional[datetime] = None):
+        with self.lock:
+            self._ensure_sequence()
+            record = {
+                "seq": self._next_seq,
+                "created_at": (created_at or datetime.now()).isoformat(),
+                "messages": [m.model_dump(mode="json") for m in messages],
+                "mastered_concepts": mastered_concepts,
+                "weak_areas": weak_areas,
+                "topic_mastery": topic_mastery,
+            }
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            self._next_seq += 1
+            # Compacting only once the log is as long as the snapshot keeps the
+            # amortized cost per append constant however long the session gets
+            pending = self._next_seq - 1 - self._snapshot_seq
+            if pending >= max(settings.HISTORY_COMPACT_EVERY, self._snapshot_seq):
+                self._compact()
+
+    def _apply(self, session: Optional[SessionHistory], records: list) -> Optional[SessionHistory]:
+        for record in records:
+            if session is None:
+                session = SessionHistory(
+                    session_id=self.session_id, user_id=self.user_id, created_at=record["created_at"]
+                )
+            session.messages.extend(ChatMessage(**m) for m in record["messages"])
+            # The mastery snapshot is the one taken at the latest turn
+            session.mastered_concepts = record["mastered_concepts"]
+            session.weak_areas = record["weak_areas"]
+            session.topic_mastery = record["topic_mastery"]
+        return session
+
+    def load(self) -> Optional[SessionHistory]:
+        with self.lock:
+            session, last_seq = self._read_snapshot()
+            return self._apply(session, self._read_records(last_seq))
+
+    def compact(self):
+        with self.lock:
+            self._ensure_sequence()
+            self._compact()
+
+    def _compact(self):
+        session, last_seq = self._read_snapshot()
+        records = self._read_records(last_seq)
+        if not records:
+            return
+        session = self._apply(session, records)
+        data = session.model_dump(mode="json")
+        data["last_seq"] = records[-1]["seq"]
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.snapshot_path)
+        # Safe to drop now: every record in the log is covered by last_seq
+        open(self.log_path, "w").close()
+        self._snapshot_seq = data["last_seq"]
+
+    def tail_messages(self, n: int) -> List[ChatMessage]:
+        with self.lock:
+            records = self._tail_records(n)
+            older = []
+            if len(records) < n:
+                # The whole log was read; earlier turns live in the snapshot
+                session, last_seq = self._read_snapshot()
+                records = [r for r in records if r["seq"] > last_seq]
+                older = session.messages if session is not None else []
+            messages = older + [ChatMessage(**m) for r in records for m in r["messages"]]
+            return messages[-n:]
+
+_session_logs: "OrderedDict[tuple, SessionLog]" = OrderedDict()
+_session_logs_lock = threading.Lock()
+
+def get_session_log(user_id: str, session_id: str) -> SessionLog:
+    key = (user_id, session_id)
+    with _session_logs_lock:
+        log = _session_logs.get(key)
+        if log is None:
+            log = _session_logs[key] = SessionLog(user_id, session_id)
+        _session_logs.move_to_end(key)
+        while len(_session_logs) > 4096:
+            _session_logs.popitem(last=False)
+        return log
+
+def append_session_turn(user_id: str, session_id: str, messages: List[ChatMessage], mastered_concepts: List[str],
+                        weak_areas: List[str], topic_mastery: dict) -> int:
+    # One appended line per turn, however long the session already is; returns the session's message count
+    now = datetime.now()
+    log = get_session_log(user_id, session_id)
+    with log.lock:
+        log.append(messages, mastered_concepts, weak_areas, topic_mastery, created_at=now)
+        return get_session_index().record_turn(
+            user_id, session_id, now, len(messages), messages[-1].content if messages else "",
+            mastered_concepts, weak_areas, topic_mastery
+        )
+
+def load_session(user_id: str, session_id: str) -> Optional[SessionHistory]:
+    return get_session_log(user_id, session_id).load()
+
+def get_recent_messages(user_id: str, session_id: str, n: int) -> List[ChatMessage]:
+    return get_session_log(user_id, session_id).tail_messages(n)
+
+def get_messages_since(user_id: str, session_id: str, start: int) -> Tuple[List[ChatMessage], int]:
+    """The session's messages from position ``start`` on, and its message count.
+
+    Only the tail of the log they span is read; the snapshot only when some
+    of them were already compacted into it.
+    """
+    index = get_session_index()
+    if not index.is_indexed(user_id):
+        _backfill_index(user_id)
+    log = get_session_log(user_id, session_id)
+    with log.lock:
+        # Turns bump the index row under this lock, so the count matches the log
+        total = index.get_message_count(user_id, session_id)
+        return (log.tail_messages(total - start) if total > start else []), total
+
+def list_session_ids(user_id: str) -> List[str]:
+    session_ids = set()
+    for filename in os.listdir(get_history_path(user_id)):
+        for suffix in (LOG_SUFFIX, SNAPSHOT_SUFFIX):
+            if filename.endswith(suffix):
+                session_ids.add(filename[:-len(suffix)])
+    return sorted(session_ids)
+
+def _backfill_index(user_id: str):
+    # Sessions written before the index existed are imported once per user
+    index = get_session_index()
+    for session_id in list_session_ids(user_id):
+        log = get_session_log(user_id, session_id)
+        # Held across the write so a concurrent turn is either in the loaded
+        # session or counted on top of the row, never overwritten by it
+        with log.lock:
+            session = log.load()
+            if session is not None:
+                index.put_session(session)
+    index.mark_indexed(user_id)
+
+def list_sessions(user_id: str, cursor: Optional[str] = None, limit: int = 20):
+    """One page of session summaries (newest first) and the cursor for the next page."""
+    index = get_session_index()
+    if not index.is_indexed(user_id):
+        _backfill_index(user_id)
+    return index.page(user_id, limit, cursor)
 
 def clear_history(user_id: str):
     path = get_history_path(user_id)
+    get_session_index().delete_user(user_id)
+    with _session_logs_lock:
+        for key in [k for k in _session_logs if k[0] == user_id]:
+            del _session_logs[key]
 
     if os.path.exists(path):
         shutil.rmtree(path)
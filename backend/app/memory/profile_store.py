@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Iterable, Optional, Tuple
+from app.config import settings
+from app.memory.user_profile import UserProfile, TopicState
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUMMARY = "No previous learning summary available."
+
+class ProfileStore(ABC):
+    """Storage backend for user profiles and learning summaries.
+
+    Backends implement the blocking methods; the ``a*`` variants run them in a
+    worker thread so async handlers never block the event loop on disk I/O.
+
+    ``shared`` backends keep a version per profile, so processes that cache
+    profiles can write them back with compare-and-swap and detect each
+    other's changes. The others are safe for a single process only.
+    """
+
+    shared = False
+
+    @abstractmethod
+    def load_profile(self, user_id: str) -> UserProfile:
+        ...
+
+    @abstractmethod
+    def save_profile(self, profile: UserProfile):
+        ...
+
+    def save_topics(self, profile: UserProfile, topic_names: Iterable[str]):
+        # Backends that cannot write single topics fall back to a full save
+        self.save_profile(profile)
+
+    def load_versioned(self, user_id: str) -> Tuple[UserProfile, int]:
+        return self.load_profile(user_id), 0
+
+    def get_version(self, user_id: str) -> int:
+        return 0
+
+    def save_versioned(self, profile: UserProfile, topic_names: Optional[Iterable[str]], version: int) -> Optional[int]:
+        """Writes the profile if it is still at ``version``; returns the new version, or None on conflict.
+
+        ``topic_names`` limits the write to those topics; None writes everything.
+        """
+        if topic_names is None:
+            self.save_profile(profile)
+        else:
+            self.save_topics(profile, topic_names)
+        return version
+
+    @abstractmethod
+    def load_summary(self, user_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def save_summary(self, user_id: str, summary: str):
+        ...
+
+    @abstractmethod
+    def delete_summary(self, user_id: str):
+        ...
+
+    async def aload_profile(self, user_id: str) -> UserProfile:
+        return await asyncio.to_thread(self.load_profile, user_id)
+
+    async def aload_versioned(self, user_id: str) -> Tuple[UserProfile, int]:
+        return await asyncio.to_thread(self.load_versioned, user_id)
+
+    async def asave_profile(self, profile: UserProfile):
+        await asyncio.to_thread(self.save_profile, profile)
+
+    async def asave_topics(self, profile: UserProfile, topic_names: Iterable[str]):
+        await asyncio.to_thread(self.save_topics, profile, list(topic_names))
+
+    async def aload_summary(self, user_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self.load_summary, user_id)
+
+    async def asave_summary(self, user_id: str, summary: str):
+        await asyncio.to_thread(self.save_summary, user_id, summary)
+
+    async def adelete_summary(self, user_id: str):
+        await asyncio.to_thread(self.delete_summary, user_id)
+
+def legacy_profile_path(user_id: str) -> str:
+    return os.path.join(settings.USER_DATA_PATH, f"{user_id}_profile.json")
+
+def legacy_summary_path(user_id: str) -> str:
+    return os.path.join(settings.USER_DATA_PATH, f"{user_id}_summary.txt")
+
+class JsonProfileStore(ProfileStore):
+    """One pretty-printed JSON file and one text file per user (the original layout)."""
+
+    def load_profile(self, user_id: str) -> UserProfile:
+        path = legacy_profile_path(user_id)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                return UserProfile(**json.load(f))
+        return UserProfile(user_id=user_id)
+
+    def save_profile(self, profile: UserProfile):
+        os.makedirs(settings.USER_DATA_PATH, exist_ok=True)
+        with open(legacy_profile_path(profile.user_id), "w") as f:
+            json.dump(profile.model_dump(mode='json'), f, indent=4)
+
+    def load_summary(self, user_id: str) -> Optional[str]:
+        path = legacy_summary_path(user_id)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                return f.read()
+        return None
+
+    def save_summary(self, user_id: str, summary: str):
+        os.makedirs(settings.USER_DATA_PATH, exist_ok=True)
+        with open(legacy_summary_path(user_id), "w") as f:
+            f.write(summary)
+
+    def delete_summary(self, user_id: str):
+        path = legacy_summary_path(user_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+class SqliteProfileStore(ProfileStore):
+    """Profiles, topics and summaries in one SQLite database in WAL mode.
+
+    Each topic is its own row, so a grade or gap update rewrites only the
+    topics it touched plus the small profile row. Users that only exist as
+    legacy JSON/text files are imported the first time they are read.
+    Every write bumps the profile row's version.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, import_legacy: bool = True):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.import_legacy = import_legacy
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            "user_id TEXT PRIMARY KEY, knowledge_level TEXT NOT NULL, explanation_preference TEXT NOT NULL, "
+            "confidence_score REAL NOT NULL, mastery REAL NOT NULL, known_concepts TEXT NOT NULL, "
+            "weak_areas TEXT NOT NULL, current_session_id TEXT, updated_at REAL NOT NULL, "
+            "version INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(profiles)")]
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE profiles ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS topics ("
+            "user_id TEXT NOT NULL, name TEXT NOT NULL, topic_id TEXT NOT NULL, mastery REAL NOT NULL, "
+            "attempted INTEGER NOT NULL, correct REAL NOT NULL, status TEXT NOT NULL, last_assessed TEXT, "
+            "PRIMARY KEY (user_id, name))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_topics_status ON topics(user_id, status)")
+        # The legacy topic_mastery map can hold names that have no TopicState
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS topic_mastery ("
+            "user_id TEXT NOT NULL, name TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (user_id, name))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries (user_id TEXT PRIMARY KEY, summary TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def has_profile(self, user_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM profiles WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def load_profile(self, user_id: str) -> UserProfile:
+        return self.load_versioned(user_id)[0]
+
+    def load_versioned(self, user_id: str) -> Tuple[UserProfile, int]:
+        with self._lock:
+            # One read transaction, so the version matches the rows read with it
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute(
+                    "SELECT knowledge_level, explanation_preference, confidence_score, mastery, known_concepts, "
+                    "weak_areas, current_session_id, version FROM profiles WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                if row is not None:
+                    topics = self._conn.execute(
+                        "SELECT name, topic_id, mastery, attempted, correct, status, last_assessed FROM topics WHERE user_id = ?",
+                        (user_id,)
+                    ).fetchall()
+                    topic_mastery = self._conn.execute(
+                        "SELECT name, value FROM topic_mastery WHERE user_id = ?", (user_id,)
+                    ).fetchall()
+            finally:
+                self._conn.commit()
+
+        if row is None:
+            profile = self._import_legacy_profile(user_id)
+            return profile, self.get_version(user_id)
+
+        profile = UserProfile(
+            user_id=user_id,
+            knowledge_level=row[0],
+            explanation_preference=row[1],
+            confidence_score=row[2],
+            mastery=row[3],
+            known_concepts=json.loads(row[4]),
+            weak_areas=json.loads(row[5]),
+            current_session_id=row[6],
+            topic_mastery=dict(topic_mastery),
+            topics={
+                name: TopicState(
+                    topic_id=topic_id, name=name, mastery=mastery, attempted=attempted,
+                    correct=correct, status=status, last_assessed=last_assessed
+                )
+                for name, topic_id, mastery, attempted, correct, status, last_assessed in topics
+            }
+        )
+        return profile, row[7]
+
+    def get_version(self, user_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _import_legacy_profile(self, user_id: str) -> UserProfile:
+        path = legacy_profile_path(user_id)
+        if not self.import_legacy or not os.path.exists(path):
+            return UserProfile(user_id=user_id)
+        profile = JsonProfileStore().load_profile(user_id)
+        self.save_profile(profile)
+        logger.info(f"Imported legacy profile for {user_id} into {self.path}")
+        return profile
+
+    def _write_profile_row(self, profile: UserProfile):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO profiles (user_id, knowledge_level, explanation_preference, confidence_score, "
+            "mastery, known_concepts, weak_areas, current_session_id, updated_at, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, "
+            "(SELECT COALESCE(MAX(version), 0) + 1 FROM profiles WHERE user_id = ?))",
+            (
+                profile.user_id, profile.knowledge_level, profile.explanation_preference, profile.confidence_score,
+                profile.mastery, json.dumps(profile.known_concepts), json.dumps(profile.weak_areas),
+                profile.current_session_id, time.time(), profile.user_id
+            )
+        )
+
+    def _write_topics(self, profile: UserProfile, names: Iterable[str]):
+        topic_rows, mastery_rows, removed = [], [], []
+        for name in names:
+            topic = profile.topics.get(name)
+            if topic is not None:
+                topic_rows.append((
+                    profile.user_id, name, topic.topic_id, topic.mastery, topic.attempted, topic.correct,
+                    topic.status, topic.last_assessed.isoformat() if topic.last_assessed else None
+                ))
+            if name in profile.topic_mastery:
+                mastery_rows.append((profile.user_id, name, profile.topic_mastery[name]))
+            if topic is None and name not in profile.topic_mastery:
+                removed.append((profile.user_id, name))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO topics (user_id, name, topic_id, mastery, attempted, correct, status, last_assessed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", topic_rows
+        )
+        self._conn.executemany("INSERT OR REPLACE INTO topic_mastery (user_id, name, value) VALUES (?, ?, ?)", mastery_rows)
+        self._conn.executemany("DELETE FROM topics WHERE user_id = ? AND name = ?", removed)
+        self._conn.executemany("DELETE FROM topic_mastery WHERE user_id = ? AND name = ?", removed)
+
+    def _write(self, profile: UserProfile, topic_names: Optional[Iterable[str]]):
+        self._write_profile_row(profile)
+        if topic_names is None:
+            self._conn.execute("DELETE FROM topics WHERE user_id = ?", (profile.user_id,))
+            self._conn.execute("DELETE FROM topic_mastery WHERE user_id = ?", (profile.user_id,))
+            topic_names = set(profile.topics) | set(profile.topic_mastery)
+        self._write_topics(profile, topic_names)
+
+    def save_profile(self, profile: UserProfile):
+        with self._lock, self._conn:
+            self._write(profile, None)
+
+    def save_topics(self, profile: UserProfile, topic_names: Iterable[str]):
+        with self._lock, self._conn:
+            self._write(profile, topic_names)
+
+    def save_versioned(self, profile: UserProfile, topic_names: Optional[Iterable[str]], version: int) -> Optional[int]:
+        with self._lock:
+            # Takes the write lock up front so the check and the write are atomic across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT version FROM profiles WHERE user_id = ?", (profile.user_id,)).fetchone()
+                if (row[0] if row else 0) != version:
+                    self._conn.rollback()
+                    return None
+                self._write(profile, topic_names)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return version + 1
+
+    def load_summary(self, user_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM summaries WHERE user_id = ?", (user_id,)).fetchone()
+        if row is not None:
+            return row[0]
+        if self.import_legacy and os.path.exists(legacy_summary_path(user_id)):
+            summary = JsonProfileStore().load_summary(user_id)
+            self.save_summary(user_id, summary)
+            return summary
+        return None
+
+    def save_summary(self, user_id: str, summary: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (user_id, summary, updated_at) VALUES (?, ?, ?)",
+                (user_id, summary, time.time())
+            )
+
+    def delete_summary(self, user_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM summaries WHERE user_id = ?", (user_id,))
+        # Make sure the legacy file is not imported again on the next read
+        path = legacy_summary_path(user_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+_profile_store = None
+
+def get_profile_store() -> ProfileStore:
+    global _profile_store
+    if _profile_store is None:
+        if settings.PROFILE_BACKEND == "json":
+            _profile_store = JsonProfileStore()
+        else:
+            _profile_store = SqliteProfileStore(os.path.join(settings.USER_DATA_PATH, "profiles.sqlite3"))
+    return _profile_store
@@ -0,0 +1,164 @@
+import os
+import json
+import base64
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+from app.config import settings
+
+PREVIEW_CHARS = 200
+
+def encode_cursor(created_ts: float, session_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_ts, session_id]).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        created_ts, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(created_ts), str(session_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+class SessionIndex:
+    """One row per chat session with what the history list shows.
+
+    Rows are updated in place on every appended turn, so listing a user's
+    sessions is a single indexed range scan instead of reading every session
+    file. Pages are keyed on (created_at, session_id), newest first.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id TEXT NOT NULL, session_id TEXT NOT NULL, created_at TEXT NOT NULL, created_ts REAL NOT NULL, "
+            "updated_at TEXT NOT NULL, message_count INTEGER NOT NULL, last_message TEXT NOT NULL, "
+            "mastered_concepts TEXT NOT NULL, weak_areas TEXT NOT NULL, topic_mastery TEXT NOT NULL, "
+            "PRIMARY KEY (user_id, session_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_created ON sessions(user_id, created_ts DESC, session_id DESC)")
+        # Users whose pre-index session files have been imported
+        self._conn.execute("CREATE TABLE IF NOT EXISTS indexed_users (user_id TEXT PRIMARY KEY)")
+        # How many of a session's messages are already folded into the user's summary
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summary_checkpoints ("
+            "user_id TEXT NOT NULL, session_id TEXT NOT NULL, folded_messages INTEGER NOT NULL, "
+            "PRIMARY KEY (user_id, session_id))"
+        )
+        self._conn.commit()
+
+    def record_turn(self, user_id: str, session_id: str, created_at: datetime, added_messages: int, last_message: str,
+                    mastered_concepts: List[str], weak_areas: List[str], topic_mastery: dict) -> int:
+        # Returns the session's message count after this turn
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "INSERT INTO sessions (user_id, session_id, created_at, created_ts, updated_at, message_count, last_message, "
+                "mastered_concepts, weak_areas, topic_mastery) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, session_id) DO UPDATE SET updated_at = excluded.updated_at, "
+                "message_count = message_count + excluded.message_count, last_message = excluded.last_message, "
+                "mastered_concepts = excluded.mastered_concepts, weak_areas = excluded.weak_areas, "
+                "topic_mastery = excluded.topic_mastery RETURNING message_count",
+                (
+                    user_id, session_id, created_at.isoformat(), created_at.timestamp(), now, added_messages,
+                    last_message[:PREVIEW_CHARS], json.dumps(mastered_concepts), json.dumps(weak_areas),
+                    json.dumps(topic_mastery)
+                )
+            ).fetchone()
+        return row[0]
+
+    def put_session(self, session):
+        # Absolute values from a full SessionHistory, used when backfilling
+        last_message = session.messages[-1].content if session.messages else ""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (user_id, session_id, created_at, created_ts, updated_at, message_count, "
+                "last_message, mastered_concepts, weak_areas, topic_mastery) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    session.user_id, session.session_id, session.created_at.isoformat(), session.created_at.timestamp(),
+                    session.created_at.isoformat(), len(session.messages), last_message[:PREVIEW_CHARS],
+                    json.dumps(session.mastered_concepts), json.dumps(session.weak_areas), json.dumps(session.topic_mastery)
+                )
+            )
+
+    def is_indexed(self, user_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM indexed_users WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def mark_indexed(self, user_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO indexed_users (user_id) VALUES (?)", (user_id,))
+
+    def get_message_count(self, user_id: str, session_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT message_count FROM sessions WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_summary_checkpoint(self, user_id: str, session_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT folded_messages FROM summary_checkpoints WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set_summary_checkpoint(self, user_id: str, session_id: str, folded_messages: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summary_checkpoints (user_id, session_id, folded_messages) VALUES (?, ?, ?)",
+                (user_id, session_id, folded_messages)
+            )
+
+    def page(self, user_id: str, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        query = (
+            "SELECT session_id, created_at, created_ts, updated_at, message_count, last_message, mastered_concepts, "
+            "weak_areas, topic_mastery FROM sessions WHERE user_id = ?"
+        )
+        params = [user_id]
+        if cursor:
+            created_ts, session_id = decode_cursor(cursor)
+            query += " AND (created_ts < ? OR (created_ts = ? AND session_id < ?))"
+            params += [created_ts, created_ts, session_id]
+        query += " ORDER BY created_ts DESC, session_id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        next_cursor = encode_cursor(rows[limit - 1][2], rows[limit - 1][0]) if len(rows) > limit else None
+        sessions = [
+            {
+                "session_id": session_id,
+                "user_id": user_id,
+                "created_at": created_at,
+                "updated_at": updated_at,
+                "message_count": message_count,
+                "last_message": last_message,
+                "mastered_concepts": json.loads(mastered_concepts),
+                "weak_areas": json.loads(weak_areas),
+                "topic_mastery": json.loads(topic_mastery),
+            }
+            for session_id, created_at, _, updated_at, message_count, last_message, mastered_concepts, weak_areas, topic_mastery
+            in rows[:limit]
+        ]
+        return sessions, next_cursor
+
+    def delete_user(self, user_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM summary_checkpoints WHERE user_id = ?", (user_id,))
+            # Nothing left on disk to import either
+            self._conn.execute("INSERT OR IGNORE INTO indexed_users (user_id) VALUES (?)", (user_id,))
+
+_session_index = None
+
+def get_session_index() -> SessionIndex:
+    global _session_index
+    if _session_index is None:
+        _session_index = SessionIndex(os.path.join(settings.USER_DATA_PATH, "history", "sessions.sqlite3"))
+    return _session_index
@@ -1,19 +1,11 @@
-import os
-import json
-from app.config import settings
-
-def get_user_summary_path(user_id: str):
-    os.makedirs(settings.USER_DATA_PATH, exist_ok=True)
-    return os.path.join(settings.USER_DATA_PATH, f"{user_id}_summary.txt")
+from app.memory.profile_store import get_profile_store, DEFAULT_SUMMARY
 
 def load_user_summary(user_id: str) -> str:
-    path = get_user_summary_path(user_id)
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            return f.read()
-    return "No previous learning summary available."
+    summary = get_profile_store().load_summary(user_id)
+    return summary if summary is not None else DEFAULT_SUMMARY
 
 def save_user_summary(user_id: str, summary: str):
-    path = get_user_summary_path(user_id)
-    with open(path, "w") as f:
-        f.write(summary)
+    get_profile_store().save_summary(user_id, summary)
+
+def clear_user_summary(user_id: str):
+    get_profile_store().delete_summary(user_id)
@@ -1,8 +1,5 @@
-import os
-import json
 from pydantic import BaseModel
 from typing import List, Optional, Dict
-from app.config import settings
 from datetime import datetime
 
 class TopicState(BaseModel):
@@ -26,18 +23,10 @@ class UserProfile(BaseModel):
     topics: Dict[str, TopicState] = {} # topic_name -> TopicState
     current_session_id: Optional[str] = None
 
-def get_user_profile_path(user_id: str):
-    os.makedirs(settings.USER_DATA_PATH, exist_ok=True)
-    return os.path.join(settings.USER_DATA_PATH, f"{user_id}_profile.json")
-
 def load_user_profile(user_id: str) -> UserProfile:
-    path = get_user_profile_path(user_id)
-    if os.path.exists(path):
-        with open(path, "r") as f:
-            return UserProfile(**json.load(f))
-    return UserProfile(user_id=user_id)
+    from app.memory.profile_store import get_profile_store
+    return get_profile_store().load_profile(user_id)
 
 def save_user_profile(profile: UserProfile):
-    path = get_user_profile_path(profile.user_id)
-    with open(path, "w") as f:
-        json.dump(profile.model_dump(mode='json'), f, indent=4)
+    from app.memory.profile_store import get_profile_store
+    get_profile_store().save_profile(profile)
@@ -0,0 +1,294 @@
+import os
+import copy
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional
+from app.config import settings
+from app.memory.user_profile import UserProfile
+from app.memory.profile_store import get_profile_store
+
+logger = logging.getLogger(__name__)
+
+# Bounded retries when other processes keep winning the compare-and-swap
+MAX_FLUSH_ATTEMPTS = 5
+
+class UserState:
+    def __init__(self, loading: asyncio.Future):
+        # Resolves to (profile, store version it was read at)
+        self.loading = loading
+        self.lock = asyncio.Lock()
+        # Topics changed since the last flush; full_dirty means write the whole profile
+        self.dirty_topics: Optional[set] = None
+        self.full_dirty = False
+        self.dirty_since: Optional[float] = None
+        # Changes applied since the last flush, replayed onto a fresh copy if
+        # another process wrote the profile in the meantime
+        self.pending: List[Callable[[UserProfile], None]] = []
+        self.checked_at = time.monotonic()
+
+    @property
+    def profile(self) -> UserProfile:
+        return self.loading.result()[0]
+
+    @property
+    def version(self) -> int:
+        return self.loading.result()[1]
+
+    def set(self, profile: UserProfile, version: int):
+        self.loading = asyncio.get_running_loop().create_future()
+        self.loading.set_result((profile, version))
+
+    @property
+    def dirty(self) -> bool:
+        return self.full_dirty or self.dirty_topics is not None
+
+    def mark(self, topics: Optional[Iterable[str]]):
+        if topics is None:
+            self.full_dirty = True
+        else:
+            self.dirty_topics = (self.dirty_topics or set()) | set(topics)
+        if self.dirty_since is None:
+            self.dirty_since = time.monotonic()
+
+class UserStateManager:
+    """Keeps hot user profiles in memory and writes them back lazily.
+
+    Every mutation of a user's profile runs under that user's lock, so
+    concurrent grading and gap detection can no longer overwrite each other.
+    Changes are marked dirty and flushed together after at most
+    ``flush_interval`` seconds, so a busy user costs one write per interval
+    instead of one per update. Clean profiles are evicted in LRU order once
+    more than ``max_users`` are resident.
+
+    Each process keeps its own copy of a hot profile. With a shared
+    (versioned) store, flushes are compare-and-swap: if another worker wrote
+    the profile since it was read, the fresh copy is loaded and this
+    process's pending changes are replayed onto it. Clean cached profiles are
+    re-checked against the store version at most once per ``flush_interval``.
+    Stores without versions cannot do this, so ``claim()`` then takes an
+    exclusive lock and a second process fails fast instead of losing updates.
+    """
+
+    def __init__(self, flush_interval: float = 2.0, max_users: int = 1000):
+        self.flush_interval = flush_interval
+        self.max_users = max_users
+        self._states: "OrderedDict[str, UserState]" = OrderedDict()
+        self._flush_task = None
+        self._owner_lock = None
+        self.loads = 0
+        self.hits = 0
+        self.flushes = 0
+        self.profiles_written = 0
+        self.conflicts = 0
+        self.refreshes = 0
+        self.max_staleness = 0.0
+
+    def claim(self, data_path: str):
+        if get_profile_store().shared:
+            return
+        try:
+            import fcntl
+        except ImportError:
+            # No flock on this platform; the single-worker rule is then up to the deployment
+            logger.warning("Cannot lock the profile store on this platform; run a single API worker")
+            return
+        os.makedirs(data_path, exist_ok=True)
+        # Held open for the life of the process; the OS releases the lock when it exits
+        self._owner_lock = open(os.path.join(data_path, "profiles.lock"), "a")
+        try:
+            fcntl.flock(self._owner_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._owner_lock.close()
+            self._owner_lock = None
+            raise RuntimeError(
+                f"Another process already owns the profile store in {data_path}. PROFILE_BACKEND="
+                f"{settings.PROFILE_BACKEND} keeps no versions, so run a single API worker or use PROFILE_BACKEND=sqlite."
+            )
+
+    async def _get_state(self, user_id: str) -> UserState:
+        store = get_profile_store()
+        state = self._states.get(user_id)
+        if state is None:
+            state = UserState(asyncio.ensure_future(store.aload_versioned(user_id)))
+            self._states[user_id] = state
+            self.loads += 1
+            self._evict()
+        else:
+            self.hits += 1
+        self._states.move_to_end(user_id)
+        try:
+            await state.loading
+        except Exception:
+            if self._states.get(user_id) is state:
+                del self._states[user_id]
+            raise
+        now = time.monotonic()
+        if store.shared and not state.dirty and now - state.checked_at >= self.flush_interval:
+            # Pick up what other workers wrote; dirty profiles find out on flush instead
+            state.checked_at = now
+            if await asyncio.to_thread(store.get_version, user_id) != state.version:
+                fresh = await store.aload_versioned(user_id)
+                async with state.lock:
+                    # Our own flush may have written a newer version meanwhile
+                    if not state.dirty and fresh[1] > state.version:
+                        state.set(*fresh)
+                        self.refreshes += 1
+        return state
+
+    async def get(self, user_id: str) -> UserProfile:
+        # The live profile; change it only through update()
+        return (await self._get_state(user_id)).profile
+
+    async def update(self, user_id: str, change: Callable[[UserProfile], None], topics: Optional[Iterable[str]] = None):
+        """Applies ``change`` to the profile under the user's lock and schedules a write-behind.
+
+        ``change`` may be applied again to a fresh copy if another process
+        wrote the profile first, so it must only depend on the profile and
+        its own arguments. Pass ``topics`` when the change only touches those
+        topics (plus the profile's scalar fields) so the flush can skip the
+        rest of the profile.
+        """
+        state = await self._get_state(user_id)
+        async with state.lock:
+            try:
+                change(state.profile)
+            finally:
+                # Even a half-applied change is what readers now see, so persist it
+                state.pending.append(change)
+                state.mark(topics)
+        self._schedule_flush()
+
+    async def replace(self, profile: UserProfile):
+        # For resets: swap the whole profile and persist it straight away,
+        # overriding whatever other processes hold
+        def overwrite(target: UserProfile):
+            for field in UserProfile.model_fields:
+                setattr(target, field, copy.deepcopy(getattr(profile, field)))
+
+        state = await self._get_state(profile.user_id)
+        async with state.lock:
+            version = await asyncio.to_thread(get_profile_store().get_version, profile.user_id)
+            state.set(profile, version)
+            state.pending = [overwrite]
+            state.mark(None)
+        await self.flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        # Cleared first so changes made while this flush is writing get their own timer
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        batch = []
+        now = time.monotonic()
+        for user_id, state in list(self._states.items()):
+            if not state.dirty or not state.loading.done():
+                continue
+            async with state.lock:
+                # Snapshot under the lock so the write sees a consistent profile
+                topics = None if state.full_dirty else state.dirty_topics
+                batch.append((state, state.profile.model_copy(deep=True), state.version, topics, state.pending))
+                self.max_staleness = max(self.max_staleness, now - state.dirty_since)
+                state.dirty_topics, state.full_dirty, state.dirty_since = None, False, None
+                state.pending = []
+        if not batch:
+            return
+
+        results = await asyncio.to_thread(
+            self._write_batch, [(profile, version, topics, pending) for _, profile, version, topics, pending in batch]
+        )
+        failed = False
+        for (state, _, _, topics, pending), result in zip(batch, results):
+            async with state.lock:
+                if result is None:
+                    state.pending = pending + state.pending
+                    state.mark(topics)
+                    failed = True
+                    continue
+                version, merged = result
+                if merged is None:
+                    state.set(state.profile, version)
+                    continue
+                # Another process wrote first: adopt the merged copy plus anything applied since the snapshot
+                for change in state.pending:
+                    self._replay(change, merged)
+                state.set(merged, version)
+        if failed:
+            self._schedule_flush()
+        self.flushes += 1
+        self.profiles_written += len(batch)
+        self._evict()
+
+    def _replay(self, change, profile: UserProfile):
+        try:
+            change(profile)
+        except Exception as e:
+            logger.error(f"Replaying a profile change for {profile.user_id} failed: {e}")
+
+    def _write_batch(self, batch: list) -> list:
+        # Per profile: (new version, merged profile if another process had
+        # written it, else None), or None if the write failed and must be retried
+        store = get_profile_store()
+        results = []
+        for profile, version, topics, pending in batch:
+            try:
+                results.append(self._write_one(store, profile, version, topics, pending))
+            except Exception as e:
+                logger.error(f"Profile flush for {profile.user_id} failed, will retry: {e}")
+                results.append(None)
+        return results
+
+    def _write_one(self, store, profile: UserProfile, version: int, topics, pending: list):
+        merged = None
+        for _ in range(MAX_FLUSH_ATTEMPTS):
+            new_version = store.save_versioned(merged or profile, topics if merged is None else None, version)
+            if new_version is not None:
+                return new_version, merged
+            self.conflicts += 1
+            merged, version = store.load_versioned(profile.user_id)
+            for change in pending:
+                self._replay(change, merged)
+        raise RuntimeError(f"the profile kept changing during {MAX_FLUSH_ATTEMPTS} attempts")
+
+    async def flush_all(self):
+        # On shutdown: cancel the timer and write everything that is dirty now
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+
+    def _evict(self):
+        excess = len(self._states) - self.max_users
+        if excess <= 0:
+            return
+        for user_id, state in list(self._states.items()):
+            if excess <= 0:
+                break
+            if state.dirty or state.lock.locked() or not state.loading.done():
+                continue
+            del self._states[user_id]
+            excess -= 1
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        dirty = [s for s in self._states.values() if s.dirty]
+        return {
+            "resident_users": len(self._states),
+            "dirty_users": len(dirty),
+            "oldest_dirty_seconds": round(max((now - s.dirty_since for s in dirty), default=0.0), 3),
+            "max_staleness_seconds": round(self.max_staleness, 3),
+            "loads": self.loads,
+            "hits": self.hits,
+            "flushes": self.flushes,
+            "profiles_written": self.profiles_written,
+            "conflicts": self.conflicts,
+            "refreshes": self.refreshes,
+        }
+
+user_state = UserStateManager(flush_interval=settings.PROFILE_FLUSH_INTERVAL, max_users=settings.PROFILE_CACHE_MAX_USERS)
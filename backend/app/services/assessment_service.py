@@ -1,149 +1,185 @@
-import json
+import time
+import asyncio
 import logging
 from datetime import datetime
 from app.llm.ollama_client import get_ollama_llm
 from app.llm.prompts import MCQ_GENERATION_PROMPT, QA_GENERATION_PROMPT, GRADING_PROMPT
+from app.llm.scheduler import llm_scheduler, Priority
+from app.llm.metrics import llm_metrics
+from app.llm.json_parser import IncrementalObjectParser
+from app.llm.structured_output import structured_output
 from app.vectorstore.retriever import retrieve_context
-from app.memory.user_profile import load_user_profile, save_user_profile
+from app.memory.user_state import user_state
 from app.services.question_store import question_store
+from app.services.grading_cache import grading_cache
 from app.api.upload import get_user_uploaded_content
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 class AssessmentService:
     def __init__(self):
-        self.llm = get_ollama_llm(temperature=0.7)
-        self.grading_llm = get_ollama_llm(temperature=0)
+        self.llms = {
+            "mcq_gen": get_ollama_llm("mcq_gen", temperature=0.7),
+            "qa_gen": get_ollama_llm("qa_gen", temperature=0.7),
+        }
+        self.grading_llm = get_ollama_llm("grade", temperature=0)
 
-    async def generate_mcqs(self, user_id: str, topics: list[str], count: int = 5, query: str = None):
-        profile = load_user_profile(user_id)
+    async def _build_generation_prompt(self, user_id: str, kind: str, topics: list[str], count: int, query: str = None, size: str = "medium"):
         search_query = f"{' '.join(topics)} {query}" if query else " ".join(topics)
         
         # Check for uploaded content first
-        uploaded_content = get_user_uploaded_content(user_id)
+        uploaded_content = await get_user_uploaded_content(user_id, search_query)
         if uploaded_content:
             context = uploaded_content
-            logger.info(f"Using uploaded content as context for MCQ generation (user: {user_id})")
+            logger.info(f"Using uploaded content as context for {kind} generation (user: {user_id})")
         else:
             context = await retrieve_context(search_query)
-            logger.info(f"Retrieved context from vector store for MCQ generation (user: {user_id})")
+            logger.info(f"Retrieved context from vector store for {kind} generation (user: {user_id})")
         
         if not context:
-            logger.warning(f"No context found for MCQ generation (user: {user_id}, query: {search_query})")
+            logger.warning(f"No context found for {kind} generation (user: {user_id}, query: {search_query})")
         
         if query:
             topics_str = f"{query} (within topics: {', '.join(topics)})" if topics else query
         else:
             topics_str = ", ".join(topics)
             
-        prompt = MCQ_GENERATION_PROMPT.format(count=count, topics=topics_str, context=context)
+        if kind == "MCQ":
+            prompt = MCQ_GENERATION_PROMPT.format(count=count, topics=topics_str, context=context)
+        else:
+            prompt = QA_GENERATION_PROMPT.format(count=count, size=size, topics=topics_str, context=context)
         
-        logger.info(f"Generating {count} MCQs for topics: {topics_str}")
-        response = await self.llm.ainvoke(prompt)
+        logger.info(f"Generating {count} {kind} for topics: {topics_str}")
+        return prompt
+
+    async def register_question(self, q: dict, kind: str, topics: list[str]) -> dict:
+        return (await self.register_questions([q], kind, topics))[0]
+
+    async def register_questions(self, questions: list[dict], kind: str, topics: list[str]) -> list[dict]:
+        # One store write for the whole quiz
+        for q in questions:
+            q["topic"] = topics[0] if topics else "General"
+            q["type"] = kind
+        for q, q_id in zip(questions, await question_store.aput_many(questions)):
+            q["id"] = q_id
+        return questions
+
+    async def generate_raw(self, user_id: str, kind: str, topics: list[str], count: int, query: str = None, size: str = "medium",
+                           priority: Priority = Priority.ASSESSMENT):
+        # Parsed questions that are not yet registered in the question store
+        prompt = await self._build_generation_prompt(user_id, kind, topics, count, query, size)
+
+        task = "mcq_gen" if kind == "MCQ" else "qa_gen"
+        async with llm_scheduler.slot(priority, user_id):
+            started = time.perf_counter()
+            response = await structured_output.bind(self.llms[task], task).ainvoke(prompt)
+            latency = time.perf_counter() - started
+        llm_metrics.record(task, response.response_metadata, latency=latency)
         # Extract content from AIMessage
         content = response.content if hasattr(response, 'content') else str(response)
         
-        logger.debug(f"LLM response for MCQ: {content}")
-        questions = self._parse_json(content)
+        logger.debug(f"LLM response for {kind}: {content}")
+        questions = structured_output.parse(task, content)
         
         if questions is None:
-            logger.error(f"Failed to parse MCQs from LLM response. Content: {content[:500]}...")
+            logger.error(f"Failed to parse {kind} from LLM response. Content: {content[:500]}...")
             return None # Keep None for now to trigger 500, but we'll see if we want to change it
         
-        if not isinstance(questions, list):
-            questions = [questions]
-
-        if isinstance(questions, list):
-            for q in questions:
-                q["topic"] = topics[0] if topics else "General"
-                q["type"] = "MCQ"
-                q_id = question_store.save_question(q)
-                q["id"] = q_id
-        
         return questions
 
-    async def generate_qa(self, user_id: str, topics: list[str], size: str = "medium", count: int = 3, query: str = None):
-        profile = load_user_profile(user_id)
-        search_query = f"{' '.join(topics)} {query}" if query else " ".join(topics)
-        
-        # Check for uploaded content first
-        uploaded_content = get_user_uploaded_content(user_id)
-        if uploaded_content:
-            context = uploaded_content
-            logger.info(f"Using uploaded content as context for QA generation (user: {user_id})")
-        else:
-            context = await retrieve_context(search_query)
-            logger.info(f"Retrieved context from vector store for QA generation (user: {user_id})")
-        
-        if not context:
-            logger.warning(f"No context found for QA generation (user: {user_id}, query: {search_query})")
-        
-        if query:
-            topics_str = f"{query} (within topics: {', '.join(topics)})" if topics else query
-        else:
-            topics_str = ", ".join(topics)
-            
-        prompt = QA_GENERATION_PROMPT.format(count=count, size=size, topics=topics_str, context=context)
-        
-        logger.info(f"Generating {count} QA for topics: {topics_str}")
-        response = await self.llm.ainvoke(prompt)
-        # Extract content from AIMessage
-        content = response.content if hasattr(response, 'content') else str(response)
-        
-        logger.debug(f"LLM response for QA: {content}")
-        questions = self._parse_json(content)
-        
+    async def _generate(self, user_id: str, kind: str, topics: list[str], count: int, query: str = None, size: str = "medium"):
+        questions = await self.generate_raw(user_id, kind, topics, count, query, size)
         if questions is None:
-            logger.error(f"Failed to parse QA from LLM response. Content: {content[:500]}...")
             return None
-        
-        if not isinstance(questions, list):
-            questions = [questions]
 
-        if isinstance(questions, list):
-            for q in questions:
-                q["topic"] = topics[0] if topics else "General"
-                q["type"] = "QA"
-                q_id = question_store.save_question(q)
-                q["id"] = q_id
-        
-        return questions
+        return await self.register_questions(questions, kind, topics)
 
-    async def grade_mcq(self, user_id: str, question_id: str, selected_option: int):
-        stored_q = question_store.get_question(question_id)
+    async def generate_mcqs(self, user_id: str, topics: list[str], count: int = 5, query: str = None):
+        return await self._generate(user_id, "MCQ", topics, count, query)
+
+    async def generate_qa(self, user_id: str, topics: list[str], size: str = "medium", count: int = 3, query: str = None):
+        return await self._generate(user_id, "QA", topics, count, query, size)
+
+    async def stream_questions(self, user_id: str, kind: str, topics: list[str], count: int, query: str = None, size: str = "medium"):
+        # Yield each question as soon as its JSON object closes in the token stream
+        prompt = await self._build_generation_prompt(user_id, kind, topics, count, query, size)
+        task = "mcq_gen" if kind == "MCQ" else "qa_gen"
+        parser = IncrementalObjectParser()
+        produced = 0
+        dropped = 0
+        response_metadata = {}
+        first_token_latency = None
+
+        try:
+            async with llm_scheduler.slot(Priority.ASSESSMENT, user_id):
+                started = time.perf_counter()
+                async for chunk in structured_output.bind(self.llms[task], task).astream(prompt):
+                    if chunk.response_metadata:
+                        response_metadata = chunk.response_metadata
+                    text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    if text and first_token_latency is None:
+                        first_token_latency = time.perf_counter() - started
+                    for obj in parser.feed(text):
+                        q = structured_output.validate_item(task, obj)
+                        if q is None:
+                            dropped += 1
+                            continue
+                        produced += 1
+                        yield await self.register_question(q, kind, topics)
+                        if produced >= count:
+                            return
+        finally:
+            structured_output.record(task, "failed" if not produced else "recovered" if dropped else "structured")
+            if first_token_latency is not None:
+                # Stopping early once enough questions arrived leaves no final metadata chunk
+                llm_metrics.record(task, response_metadata, latency=time.perf_counter() - started,
+                                   first_token_latency=first_token_latency)
+
+        if not produced:
+            logger.error(f"No {kind} parsed from streamed LLM response (user: {user_id})")
+
+    def _score_mcq(self, stored_q: dict, selected_option: int):
         if not stored_q or stored_q.get("type") != "MCQ":
-            return None
+            return None, None
         
         correct_answer = stored_q.get("correct_answer")
         is_correct = (selected_option == correct_answer)
         topic_name = stored_q.get("topic")
         
-        profile = load_user_profile(user_id)
-        self._update_mastery(profile, topic_name, 1.0 if is_correct else 0.0)
-        save_user_profile(profile)
-        
-        return {
+        result = {
             "is_correct": is_correct,
             "correct_option": correct_answer,
             "explanation": stored_q.get("explanation", "")
         }
+        return result, (topic_name, 1.0 if is_correct else 0.0)
 
-    async def grade_answer(self, user_id: str, topic: str = None, question: str = None, key_points: str = None, user_answer: str = None, question_id: str = None):
+    async def _score_answer(self, user_id: str, topic: str = None, question: str = None, key_points: str = None, user_answer: str = None, question_id: str = None,
+                            stored_q: dict = None):
         if question_id:
-            stored_q = question_store.get_question(question_id)
+            if stored_q is None:
+                stored_q = await question_store.aget_question(question_id)
             if stored_q:
                 question = stored_q.get("question")
                 key_points = stored_q.get("suggested_answer_key_points")
                 topic = stored_q.get("topic")
         
         if not question or not key_points:
-            return None
+            return None, None
 
-        prompt = GRADING_PROMPT.format(question=question, key_points=key_points, user_answer=user_answer)
-        response = await self.grading_llm.ainvoke(prompt)
-        # Extract content from AIMessage
-        content = response.content if hasattr(response, 'content') else str(response)
-        result = self._parse_json(content)
+        async def grade():
+            prompt = GRADING_PROMPT.format(question=question, key_points=key_points, user_answer=user_answer)
+            async with llm_scheduler.slot(Priority.ASSESSMENT, user_id):
+                started = time.perf_counter()
+                response = await structured_output.bind(self.grading_llm, "grade").ainvoke(prompt)
+                latency = time.perf_counter() - started
+            llm_metrics.record("grade", response.response_metadata, latency=latency)
+            # Extract content from AIMessage
+            content = response.content if hasattr(response, 'content') else str(response)
+            return structured_output.parse("grade", content)
+
+        # Grading is deterministic, so a cached result still counts towards mastery below
+        result = await grading_cache.get_or_grade(grading_cache.key(question, key_points, user_answer), grade)
         
         if result and topic:
             total_score = result.get("total_score", 0)
@@ -151,13 +187,71 @@ class AssessmentService:
             # Score >= 4 → correct (+1)
             # Score < 4 → incorrect (0)
             points = 1.0 if total_score >= 4 else 0.0
+            return result, (topic, points)
             
-            profile = load_user_profile(user_id)
-            self._update_mastery(profile, topic, points)
-            save_user_profile(profile)
+        return result, None
+
+    async def _apply_mastery_updates(self, user_id: str, updates: list):
+        # One locked update of just the graded topics, however many answers there were
+        if not updates:
+            return
+        def apply(profile):
+            for topic_name, points in updates:
+                self._update_mastery(profile, topic_name, points)
+
+        await user_state.update(user_id, apply, topics={topic_name for topic_name, _ in updates})
+
+    async def grade_mcq(self, user_id: str, question_id: str, selected_option: int):
+        result, update = self._score_mcq(await question_store.aget_question(question_id), selected_option)
+        if result is None:
+            return None
+        
+        await self._apply_mastery_updates(user_id, [update])
+        return result
+
+    async def grade_mcq_batch(self, user_id: str, answers: dict[str, int]):
+        results, updates = {}, []
+        stored = await question_store.aget_many(answers)
+        for q_id, opt in answers.items():
+            result, update = self._score_mcq(stored.get(q_id), opt)
+            if result:
+                results[q_id] = result
+                updates.append(update)
+        await self._apply_mastery_updates(user_id, updates)
+        return results
+
+    async def grade_answer(self, user_id: str, topic: str = None, question: str = None, key_points: str = None, user_answer: str = None, question_id: str = None):
+        result, update = await self._score_answer(user_id, topic, question, key_points, user_answer, question_id)
+        
+        if update:
+            await self._apply_mastery_updates(user_id, [update])
             
         return result
 
+    async def grade_answer_batch(self, user_id: str, answers: dict[str, str]):
+        # Grade concurrently, then apply every mastery delta in submission order
+        semaphore = asyncio.Semaphore(settings.GRADING_CONCURRENCY)
+        stored = await question_store.aget_many(answers)
+
+        async def grade_one(q_id: str, user_answer: str):
+            async with semaphore:
+                try:
+                    return await self._score_answer(user_id, user_answer=user_answer, question_id=q_id, stored_q=stored.get(q_id))
+                except Exception as e:
+                    logger.error(f"Error grading answer for question {q_id}: {e}")
+                    return None, None
+
+        graded = await asyncio.gather(*(grade_one(q_id, ans) for q_id, ans in answers.items()))
+
+        results, updates = {}, []
+        for q_id, (result, update) in zip(answers, graded):
+            if result:
+                results[q_id] = result
+            if update:
+                updates.append(update)
+        await self._apply_mastery_updates(user_id, updates)
+        return results
+
     def _update_mastery(self, profile, topic_name, points):
         from app.memory.user_profile import TopicState
         import uuid
@@ -198,80 +292,3 @@ class AssessmentService:
         
         # Sync with old topic_mastery for compatibility
         profile.topic_mastery[topic_name] = topic.mastery
-
-    def _parse_json(self, text: str):
-        if not isinstance(text, str):
-            logger.error(f"Expected string for JSON parsing, got {type(text)}")
-            try:
-                text = text.content if hasattr(text, 'content') else str(text)
-            except:
-                return None
-
-        # Clean up common LLM artifacts
-        text = text.strip()
-        
-        # Remove markdown code blocks if present
-        if text.startswith("```"):
-            # Find the end of the first line (e.g., ```json)
-            first_newline = text.find("\n")
-            if first_newline != -1:
-                text = text[first_newline:].strip()
-            # Remove trailing ```
-            if text.endswith("```"):
-                text = text[:-3].strip()
-        
-        # Try direct parsing first
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-
-        try:
-            # Find all JSON blocks
-            # We'll look for [ ] first as it's the expected format
-            start_bracket = text.find("[")
-            end_bracket = text.rfind("]")
-            
-            if start_bracket != -1 and end_bracket != -1 and end_bracket > start_bracket:
-                json_str = text[start_bracket:end_bracket+1]
-                try:
-                    return json.loads(json_str)
-                except json.JSONDecodeError:
-                    pass
-
-            # If no list found or parsing failed, try finding all { } blocks
-            import re
-            # Extract anything that looks like a JSON object
-            # This handles cases where LLM returns multiple objects not in a list
-            blocks = []
-            depth = 0
-            start = -1
-            for i, char in enumerate(text):
-                if char == '{':
-                    if depth == 0:
-                        start = i
-                    depth += 1
-                elif char == '}':
-                    depth -= 1
-                    if depth == 0 and start != -1:
-                        blocks.append(text[start:i+1])
-                        start = -1
-            
-            if blocks:
-                results = []
-                for b in blocks:
-                    try:
-                        # Clean up common JSON errors within blocks
-                        # e.g., trailing commas
-                        b_cleaned = re.sub(r',\s*}', '}', b)
-                        results.append(json.loads(b_cleaned))
-                    except json.JSONDecodeError:
-                        continue
-                if results:
-                    return results
-
-            return None
-        except Exception as e:
-            logger.error(f"Error parsing JSON from LLM: {e}")
-            logger.error(f"Raw text: {text}")
-            return None
@@ -1,100 +1,197 @@
-import json
+import time
+import asyncio
 import logging
 from app.llm.ollama_client import get_ollama_llm
-from app.llm.prompts import GAP_DETECTOR_PROMPT
-from app.memory.user_profile import UserProfile, save_user_profile
+from app.llm.prompts import GAP_DETECTOR_BATCH_PROMPT
+from app.llm.scheduler import llm_scheduler, Priority
+from app.llm.metrics import llm_metrics
+from app.llm.structured_output import structured_output
+from app.memory.user_profile import UserProfile
+from app.memory.user_state import user_state
 
 logger = logging.getLogger(__name__)
 
 class GapDetector:
     def __init__(self):
-        self.llm = get_ollama_llm(temperature=0)
+        self.llm = get_ollama_llm("gap_detect", temperature=0)
+
+    async def _analyze(self, user_id: str, prompt: str, task: str) -> list:
+        async with llm_scheduler.slot(Priority.BACKGROUND, user_id):
+            started = time.perf_counter()
+            response = await structured_output.bind(self.llm, task).ainvoke(prompt)
+            latency = time.perf_counter() - started
+        llm_metrics.record("gap_detect", response.response_metadata, latency=latency)
+        content = response.content if hasattr(response, 'content') else str(response)
+        analyses = structured_output.parse(task, content) or []
+        return analyses if isinstance(analyses, list) else [analyses]
+
+    async def analyze_batch(self, user_id: str, turns: list) -> UserProfile:
+        # One LLM call for several turns; per-turn results are applied in order,
+        # exactly as if each turn had been analyzed on its own
+        transcript = "\n\n".join(
+            f"Turn {i}:\nUser: {message}\nAssistant: {output}" for i, (message, output) in enumerate(turns, 1)
+        )
+        prompt = GAP_DETECTOR_BATCH_PROMPT.format(count=len(turns), turns=transcript)
 
-    async def analyze_and_update(self, user_id: str, user_input: str, history: str, profile: UserProfile):
-        prompt = GAP_DETECTOR_PROMPT.format(input=user_input, history=history)
-        
         try:
-            response = await self.llm.ainvoke(prompt)
-            # Find the JSON part in case the LLM adds chatter
-            start_idx = response.find("{")
-            end_idx = response.rfind("}") + 1
-            if start_idx == -1 or end_idx == 0:
-                return profile
-
-            # Update profile
-            analysis = json.loads(response[start_idx:end_idx])
-            
-            # Update topic mastery and topics dict
-            import uuid
-            from app.memory.user_profile import TopicState
-            
-            mastery_updates = analysis.get("topic_mastery_updates", {})
-            for topic_name, delta in mastery_updates.items():
-                if topic_name not in profile.topics:
-                    profile.topics[topic_name] = TopicState(
-                        topic_id=str(uuid.uuid4()),
-                        name=topic_name
-                    )
-                
-                topic = profile.topics[topic_name]
-                current_m = profile.topic_mastery.get(topic_name, 0.0)
-                new_m = max(0.0, min(1.0, current_m + delta))
-                profile.topic_mastery[topic_name] = new_m
-                topic.mastery = new_m
-                
-                # Update status based on new mastery
-                if topic.mastery < 0.40:
-                    topic.status = "weak"
-                else:
-                    topic.status = "strong"
-
-            # Handle new concepts and weak areas lists from LLM
-            new_concepts = analysis.get("new_concepts", [])
-            weak_areas = analysis.get("weak_areas", [])
+            analyses = await self._analyze(user_id, prompt, "gap_detect_batch")
+            if not analyses:
+                return None
+            def apply(profile):
+                for analysis in analyses:
+                    self._apply_analysis(profile, analysis)
+
+            # Applied under the user's lock so concurrent grading updates are not overwritten
+            await user_state.update(user_id, apply, topics=self._touched_topics(analyses))
+            logger.info(f"Gap detection applied {len(analyses)} analyses from {len(turns)} turns for {user_id}")
+            return await user_state.get(user_id)
+        except Exception as e:
+            logger.error(f"Error in batched gap detection: {e}")
+            return None
+
+    def _touched_topics(self, analyses: list) -> set:
+        # The only topics _apply_analysis changes; everything else it touches lives on the profile row
+        names = set()
+        for analysis in analyses:
+            names.update(analysis.get("topic_mastery_updates", {}))
+            names.update(analysis.get("new_concepts", []))
+            names.update(analysis.get("weak_areas", []))
+        return names
+
+    def _apply_analysis(self, profile: UserProfile, analysis: dict):
+        # Update topic mastery and topics dict
+        import uuid
+        from app.memory.user_profile import TopicState
+        
+        mastery_updates = analysis.get("topic_mastery_updates", {})
+        for topic_name, delta in mastery_updates.items():
+            if topic_name not in profile.topics:
+                profile.topics[topic_name] = TopicState(
+                    topic_id=str(uuid.uuid4()),
+                    name=topic_name
+                )
             
-            for nc in new_concepts:
-                if nc not in profile.topics:
-                    profile.topics[nc] = TopicState(
-                        topic_id=str(uuid.uuid4()),
-                        name=nc,
-                        status="strong",
-                        mastery=0.5
-                    )
-                    profile.topic_mastery[nc] = 0.5
-                elif profile.topics[nc].status != "strong":
-                    profile.topics[nc].status = "strong"
-                    profile.topics[nc].mastery = max(profile.topics[nc].mastery, 0.4)
-                    profile.topic_mastery[nc] = profile.topics[nc].mastery
-
-            for wa in weak_areas:
-                if wa not in profile.topics:
-                    profile.topics[wa] = TopicState(
-                        topic_id=str(uuid.uuid4()),
-                        name=wa,
-                        status="weak",
-                        mastery=0.2
-                    )
-                    profile.topic_mastery[wa] = 0.2
-                elif profile.topics[wa].status != "weak":
-                    profile.topics[wa].status = "weak"
-                    profile.topics[wa].mastery = min(profile.topics[wa].mastery, 0.3)
-                    profile.topic_mastery[wa] = profile.topics[wa].mastery
-
-            # Final sync of lists
-            profile.known_concepts = [name for name, t in profile.topics.items() if t.status == "strong"]
-            profile.weak_areas = [name for name, t in profile.topics.items() if t.status == "weak"]
+            topic = profile.topics[topic_name]
+            current_m = profile.topic_mastery.get(topic_name, 0.0)
+            new_m = max(0.0, min(1.0, current_m + delta))
+            profile.topic_mastery[topic_name] = new_m
+            topic.mastery = new_m
             
-            # Adjust confidence
-            profile.confidence_score = max(0.0, min(1.0, profile.confidence_score + analysis.get("confidence_delta", 0)))
-
-            # Simple logic to upgrade level
-            if profile.confidence_score > 0.8 and profile.knowledge_level == "Beginner":
-                profile.knowledge_level = "Intermediate"
-            elif profile.confidence_score > 0.95 and profile.knowledge_level == "Intermediate":
-                profile.knowledge_level = "Advanced"
-                
-            save_user_profile(profile)
-            return profile
-        except Exception as e:
-            logger.error(f"Error in gap detection: {e}")
-            return profile
+            # Update status based on new mastery
+            if topic.mastery < 0.40:
+                topic.status = "weak"
+            else:
+                topic.status = "strong"
+
+        # Handle new concepts and weak areas lists from LLM
+        new_concepts = analysis.get("new_concepts", [])
+        weak_areas = analysis.get("weak_areas", [])
+        
+        for nc in new_concepts:
+            if nc not in profile.topics:
+                profile.topics[nc] = TopicState(
+                    topic_id=str(uuid.uuid4()),
+                    name=nc,
+                    status="strong",
+                    mastery=0.5
+                )
+                profile.topic_mastery[nc] = 0.5
+            elif profile.topics[nc].status != "strong":
+                profile.topics[nc].status = "strong"
+                profile.topics[nc].mastery = max(profile.topics[nc].mastery, 0.4)
+                profile.topic_mastery[nc] = profile.topics[nc].mastery
+
+        for wa in weak_areas:
+            if wa not in profile.topics:
+                profile.topics[wa] = TopicState(
+                    topic_id=str(uuid.uuid4()),
+                    name=wa,
+                    status="weak",
+                    mastery=0.2
+                )
+                profile.topic_mastery[wa] = 0.2
+            elif profile.topics[wa].status != "weak":
+                profile.topics[wa].status = "weak"
+                profile.topics[wa].mastery = min(profile.topics[wa].mastery, 0.3)
+                profile.topic_mastery[wa] = profile.topics[wa].mastery
+
+        # Final sync of lists
+        profile.known_concepts = [name for name, t in profile.topics.items() if t.status == "strong"]
+        profile.weak_areas = [name for name, t in profile.topics.items() if t.status == "weak"]
+        
+        # Adjust confidence
+        profile.confidence_score = max(0.0, min(1.0, profile.confidence_score + analysis.get("confidence_delta", 0)))
+
+        # Simple logic to upgrade level
+        if profile.confidence_score > 0.8 and profile.knowledge_level == "Beginner":
+            profile.knowledge_level = "Intermediate"
+        elif profile.confidence_score > 0.95 and profile.knowledge_level == "Intermediate":
+            profile.knowledge_level = "Advanced"
+
+class PendingTurns:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.turns = []
+        self.idle_task = None
+
+class GapDetectionBatcher:
+    """Collects chat turns per user and runs one gap analysis per batch.
+
+    A batch is flushed once it holds ``max_turns`` turns, after ``idle_seconds``
+    without a new turn, when the user switches session, or on shutdown.
+    """
+
+    def __init__(self, detector: GapDetector, max_turns: int = 4, idle_seconds: float = 60):
+        self.detector = detector
+        self.max_turns = max_turns
+        self.idle_seconds = idle_seconds
+        self._pending = {}
+        self._flushes = set()
+
+    async def add_turn(self, user_id: str, session_id: str, message: str, output: str):
+        pending = self._pending.get(user_id)
+        if pending is not None and pending.session_id != session_id:
+            await self.flush(user_id)
+            pending = None
+        if pending is None:
+            pending = self._pending[user_id] = PendingTurns(session_id)
+
+        pending.turns.append((message, output))
+        if pending.idle_task:
+            pending.idle_task.cancel()
+            pending.idle_task = None
+
+        if len(pending.turns) >= self.max_turns:
+            await self.flush(user_id)
+        else:
+            pending.idle_task = asyncio.create_task(self._flush_when_idle(user_id))
+
+    async def _flush_when_idle(self, user_id: str):
+        await asyncio.sleep(self.idle_seconds)
+        pending = self._pending.get(user_id)
+        if pending is not None:
+            pending.idle_task = None
+        task = asyncio.create_task(self.flush(user_id))
+        # Keep a reference so the flush is not garbage collected mid-flight
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self, user_id: str):
+        pending = self._pending.pop(user_id, None)
+        if pending is None or not pending.turns:
+            return None
+        if pending.idle_task:
+            pending.idle_task.cancel()
+        return await self.detector.analyze_batch(user_id, pending.turns)
+
+    def discard(self, user_id: str):
+        # Used on reset: the turns belong to a profile that is being wiped
+        pending = self._pending.pop(user_id, None)
+        if pending is not None and pending.idle_task:
+            pending.idle_task.cancel()
+
+    async def flush_all(self):
+        for user_id in list(self._pending):
+            await self.flush(user_id)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
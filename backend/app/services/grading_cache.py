@@ -0,0 +1,99 @@
+import copy
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from app.config import settings
+from app.llm.prompts import GRADING_PROMPT
+
+logger = logging.getLogger(__name__)
+
+def normalize_answer(text) -> str:
+    # Copy-paste and resubmits differ only in case and whitespace
+    return " ".join(str(text or "").casefold().split())
+
+class GradingCache:
+    """LRU + TTL cache of grading results for temperature-0 grading.
+
+    Keys cover the question text, the key points and the normalized answer, so
+    the same question served under different ids (e.g. from the question bank)
+    shares entries. The grading prompt and routed model are part of the key too.
+    Identical answers graded at the same moment share one LLM call.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def key(self, question: str, key_points, user_answer: str) -> str:
+        parts = [
+            GRADING_PROMPT,
+            settings.route("grade")["model"],
+            " ".join(str(question or "").split()),
+            " ".join(str(key_points or "").split()),
+            normalize_answer(user_answer),
+        ]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, result = entry
+        if time.monotonic() - created_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: dict):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic(), copy.deepcopy(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_grade(self, key: str, grade):
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            logger.info("Grading cache hit")
+            return copy.deepcopy(cached)
+
+        pending = self._pending.get(key)
+        if pending is None:
+            self.misses += 1
+            pending = asyncio.ensure_future(grade())
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        # Shielded so one cancelled caller does not cancel the grade for the others
+        result = await asyncio.shield(pending)
+        if result:
+            self.put(key, result)
+        return copy.deepcopy(result)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+grading_cache = GradingCache(max_entries=settings.GRADING_CACHE_SIZE, ttl=settings.GRADING_CACHE_TTL)
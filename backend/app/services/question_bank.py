@@ -0,0 +1,208 @@
+import copy
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict, deque
+from app.config import settings
+from app.llm.scheduler import Priority
+from app.services.assessment_service import AssessmentService
+from app.vectorstore.upload_index import upload_index
+
+logger = logging.getLogger(__name__)
+
+BANK_USER_ID = "question-bank"
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+def question_hash(question: dict) -> str:
+    return hashlib.sha1(_normalize(question.get("question", "")).encode("utf-8")).hexdigest()
+
+class Pool:
+    def __init__(self, params: tuple):
+        self.params = params
+        self.questions = deque()
+        self.refill = None
+        self.requests = 0
+        self.last_used = time.monotonic()
+
+class ServedQuestions:
+    def __init__(self):
+        self.hashes: "OrderedDict[str, None]" = OrderedDict()
+        self.last_used = time.monotonic()
+
+class QuestionBank:
+    """Per-topic pools of pre-generated questions, refilled in the background.
+
+    A request is served instantly from the pool when it holds enough questions
+    the user has not seen yet; otherwise the caller falls back to live
+    generation. A pool that drops below the low-water mark is topped back up
+    to the target size, but only for warm-listed topics or keys requested at
+    least ``min_demand`` times, so one-off queries never cost a refill. Pools
+    and per-user served sets are bounded in number and dropped after
+    ``idle_ttl`` seconds without use.
+    """
+
+    def __init__(self, service: AssessmentService, enabled: bool = True, low_water: int = 5, target: int = 15,
+                 batch_size: int = 5, max_served_per_user: int = 1000, min_demand: int = 2, max_pools: int = 256,
+                 max_users: int = 1000, idle_ttl: float = 86400):
+        self.service = service
+        self.enabled = enabled
+        self.low_water = low_water
+        self.target = target
+        self.batch_size = batch_size
+        self.max_served_per_user = max_served_per_user
+        self.min_demand = min_demand
+        self.max_pools = max_pools
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self._pools: "OrderedDict[tuple, Pool]" = OrderedDict()
+        self._warm = set()
+        self._served: "OrderedDict[str, ServedQuestions]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, kind: str, topics: list[str], query: str = None, size: str = "medium"):
+        return (kind, tuple(sorted(_normalize(t) for t in topics)), _normalize(query), size if kind == "QA" else None)
+
+    def _get_pool(self, key, params: tuple) -> Pool:
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = Pool(params)
+        pool.last_used = time.monotonic()
+        self._pools.move_to_end(key)
+        self._prune_pools(pool.last_used, key)
+        return pool
+
+    def _prune_pools(self, now: float, keep):
+        # Warm-listed pools and ones being refilled stay; the rest go idle-first
+        for key, pool in list(self._pools.items()):
+            over = len(self._pools) > self.max_pools
+            if not over and now - pool.last_used < self.idle_ttl:
+                break
+            if key == keep or key in self._warm or (pool.refill is not None and not pool.refill.done()):
+                continue
+            del self._pools[key]
+            self.evictions += 1
+
+    def _served_for(self, user_id: str) -> "OrderedDict[str, None]":
+        now = time.monotonic()
+        served = self._served.get(user_id)
+        if served is None:
+            served = self._served[user_id] = ServedQuestions()
+        served.last_used = now
+        self._served.move_to_end(user_id)
+        while self._served:
+            oldest_id, oldest = next(iter(self._served.items()))
+            if len(self._served) <= self.max_users and now - oldest.last_used < self.idle_ttl:
+                break
+            del self._served[oldest_id]
+        return served.hashes
+
+    def _mark_served(self, user_id: str, q_hash: str):
+        served = self._served_for(user_id)
+        served[q_hash] = None
+        served.move_to_end(q_hash)
+        while len(served) > self.max_served_per_user:
+            served.popitem(last=False)
+
+    async def take(self, user_id: str, kind: str, topics: list[str], count: int, query: str = None, size: str = "medium"):
+        # Uploaded files make the context user-specific, so those quizzes are never pooled
+        if not self.enabled or upload_index.has_uploads(user_id):
+            return None
+
+        key = self._key(kind, topics, query, size)
+        pool = self._get_pool(key, (kind, topics, query, size))
+        pool.requests += 1
+        served = self._served_for(user_id)
+
+        unseen = [q for q in pool.questions if question_hash(q) not in served]
+        questions = None
+        if len(unseen) >= count:
+            picked = unseen[:count]
+            picked_hashes = {question_hash(q) for q in picked}
+            # Served questions leave the pool; ones this user had already seen stay for others
+            pool.questions = deque(q for q in pool.questions if question_hash(q) not in picked_hashes)
+            for q in picked:
+                self._mark_served(user_id, question_hash(q))
+            questions = await self.service.register_questions([copy.deepcopy(q) for q in picked], kind, topics)
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        if len(pool.questions) < self.low_water and (key in self._warm or pool.requests >= self.min_demand):
+            self.schedule_refill(key)
+        return questions
+
+    def record_served(self, user_id: str, questions: list):
+        # Live-generated questions count as seen too, so the pool never repeats them
+        if not self.enabled:
+            return
+        for q in questions or []:
+            self._mark_served(user_id, question_hash(q))
+
+    def schedule_refill(self, key):
+        pool = self._pools.get(key)
+        if pool is None or (pool.refill is not None and not pool.refill.done()):
+            return
+        pool.refill = asyncio.create_task(self._refill(key, pool))
+
+    async def _refill(self, key, pool: Pool):
+        kind, topics, query, size = pool.params
+        while len(pool.questions) < self.target:
+            try:
+                questions = await self.service.generate_raw(
+                    BANK_USER_ID, kind, topics, self.batch_size, query, size, priority=Priority.BACKGROUND
+                )
+            except Exception as e:
+                logger.error(f"Question bank refill failed for {key}: {e}")
+                return
+            known = {question_hash(q) for q in pool.questions}
+            added = 0
+            for q in questions or []:
+                if not isinstance(q, dict) or "question" not in q or question_hash(q) in known:
+                    continue
+                known.add(question_hash(q))
+                pool.questions.append(q)
+                added += 1
+            if not added:
+                # The model is not producing anything new for this topic; try again on the next miss
+                return
+        logger.info(f"Question bank refilled {kind} pool for {', '.join(topics)} ({len(pool.questions)} questions)")
+
+    def warm(self, topics: list[str]):
+        if not self.enabled:
+            return
+        for topic in topics:
+            for kind in ("MCQ", "QA"):
+                key = self._key(kind, [topic])
+                self._warm.add(key)
+                self._get_pool(key, (kind, [topic], None, "medium"))
+                self.schedule_refill(key)
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pools": len(self._pools),
+            "warm_pools": len(self._warm),
+            "questions": sum(len(p.questions) for p in self._pools.values()),
+            "refilling": sum(1 for p in self._pools.values() if p.refill is not None and not p.refill.done()),
+            "users_tracked": len(self._served),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+question_bank = QuestionBank(
+    AssessmentService(),
+    enabled=settings.QUESTION_BANK_ENABLED,
+    low_water=settings.QUESTION_BANK_LOW_WATER,
+    target=settings.QUESTION_BANK_TARGET,
+    batch_size=settings.QUESTION_BANK_BATCH_SIZE,
+    min_demand=settings.QUESTION_BANK_MIN_DEMAND,
+    max_pools=settings.QUESTION_BANK_MAX_POOLS,
+    max_users=settings.QUESTION_BANK_MAX_USERS,
+    idle_ttl=settings.QUESTION_BANK_IDLE_TTL
+)
@@ -1,15 +1,198 @@
+import os
+import json
+import time
 import uuid
+import sqlite3
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from app.config import settings
 
-class QuestionStore:
-    def __init__(self):
-        self._questions = {}
+class QuestionStore(ABC):
+    """Generated questions by id, kept until they expire so answers can be graded.
+
+    Backends implement the bulk methods; single gets and puts go through them.
+    Async handlers use the ``a*`` variants, which run blocking backends in a
+    worker thread.
+    """
+
+    @abstractmethod
+    def put_many(self, questions: List[dict]) -> List[str]:
+        ...
+
+    @abstractmethod
+    def get_many(self, question_ids: Iterable[str]) -> Dict[str, dict]:
+        # Only ids that are still stored appear in the result
+        ...
+
+    @abstractmethod
+    def get_stats(self) -> dict:
+        ...
 
     def save_question(self, question: dict) -> str:
-        q_id = str(uuid.uuid4())
-        self._questions[q_id] = question
-        return q_id
+        return self.put_many([question])[0]
+
+    def get_question(self, question_id: str) -> Optional[dict]:
+        return self.get_many([question_id]).get(question_id)
+
+    async def aput_many(self, questions: List[dict]) -> List[str]:
+        return await asyncio.to_thread(self.put_many, questions)
+
+    async def aget_many(self, question_ids: Iterable[str]) -> Dict[str, dict]:
+        return await asyncio.to_thread(self.get_many, list(question_ids))
+
+    async def aget_question(self, question_id: str) -> Optional[dict]:
+        return (await self.aget_many([question_id])).get(question_id)
+
+class MemoryQuestionStore(QuestionStore):
+    """In-process LRU + TTL store; fastest, but per worker and lost on restart."""
+
+    def __init__(self, max_entries: int = 100000, ttl: float = 604800):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._questions: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def put_many(self, questions: List[dict]) -> List[str]:
+        now = time.monotonic()
+        ids = []
+        for question in questions:
+            q_id = str(uuid.uuid4())
+            self._questions[q_id] = (now, question)
+            ids.append(q_id)
+        while len(self._questions) > self.max_entries:
+            self._questions.popitem(last=False)
+            self.evictions += 1
+        return ids
+
+    def get_many(self, question_ids: Iterable[str]) -> Dict[str, dict]:
+        now = time.monotonic()
+        found = {}
+        for q_id in question_ids:
+            entry = self._questions.get(q_id)
+            if entry is not None and now - entry[0] > self.ttl:
+                del self._questions[q_id]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                continue
+            self._questions.move_to_end(q_id)
+            self.hits += 1
+            found[q_id] = entry[1]
+        return found
+
+    # Plain dict operations: no reason to pay for a thread hop
+    async def aput_many(self, questions: List[dict]) -> List[str]:
+        return self.put_many(questions)
+
+    async def aget_many(self, question_ids: Iterable[str]) -> Dict[str, dict]:
+        return self.get_many(question_ids)
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "size": len(self._questions),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
+
+class SqliteQuestionStore(QuestionStore):
+    """Questions in a SQLite database in WAL mode, shared by every worker and kept across restarts.
+
+    Expired rows are never returned. They are deleted, together with the
+    oldest rows beyond ``max_entries``, every ``prune_interval`` seconds
+    instead of on every write.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl: float = 604800, prune_interval: float = 60):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Other uvicorn workers write to the same file
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            "id TEXT PRIMARY KEY, data TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_expires ON questions(expires_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_created ON questions(created_at)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def put_many(self, questions: List[dict]) -> List[str]:
+        now = time.time()
+        rows = [(str(uuid.uuid4()), json.dumps(q), now, now + self.ttl) for q in questions]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO questions (id, data, created_at, expires_at) VALUES (?, ?, ?, ?)", rows)
+            if now - self._last_prune >= self.prune_interval:
+                self._prune(now)
+        return [row[0] for row in rows]
+
+    def _prune(self, now: float):
+        self._last_prune = now
+        self.expirations += self._conn.execute("DELETE FROM questions WHERE expires_at <= ?", (now,)).rowcount
+        count = self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+        if count > self.max_entries:
+            self.evictions += self._conn.execute(
+                "DELETE FROM questions WHERE id IN (SELECT id FROM questions ORDER BY created_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            ).rowcount
+
+    def get_many(self, question_ids: Iterable[str]) -> Dict[str, dict]:
+        question_ids = list(dict.fromkeys(question_ids))
+        if not question_ids:
+            return {}
+        placeholders = ", ".join("?" * len(question_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, data FROM questions WHERE id IN ({placeholders}) AND expires_at > ?",
+                (*question_ids, time.time())
+            ).fetchall()
+        self.hits += len(rows)
+        self.misses += len(question_ids) - len(rows)
+        return {q_id: json.loads(data) for q_id, data in rows}
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
 
-    def get_question(self, question_id: str) -> dict:
-        return self._questions.get(question_id)
+def create_question_store() -> QuestionStore:
+    backend = settings.QUESTION_STORE_BACKEND
+    if backend == "memory":
+        return MemoryQuestionStore(max_entries=settings.QUESTION_STORE_MAX_ENTRIES, ttl=settings.QUESTION_STORE_TTL)
+    if backend == "sqlite":
+        return SqliteQuestionStore(
+            settings.QUESTION_STORE_PATH, max_entries=settings.QUESTION_STORE_MAX_ENTRIES, ttl=settings.QUESTION_STORE_TTL
+        )
+    raise ValueError(f"Unknown QUESTION_STORE_BACKEND {backend!r}; expected 'sqlite' or 'memory'")
 
-question_store = QuestionStore()
+question_store = create_question_store()
@@ -0,0 +1,116 @@
+import math
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import List, Optional
+from app.config import settings
+from app.llm.prompts import SYSTEM_PROMPT, SESSION_STATE_PROMPT, REVISION_PROMPT
+
+logger = logging.getLogger(__name__)
+
+def fingerprint(text: str) -> str:
+    return hashlib.sha256(" ".join((text or "").split()).encode("utf-8")).hexdigest()[:16]
+
+# Template ids change whenever the prompt text does, so stale answers are never served
+STUDY_TEMPLATE = "study:" + fingerprint(SYSTEM_PROMPT + SESSION_STATE_PROMPT)
+REVISION_TEMPLATE = "revision:" + fingerprint(REVISION_PROMPT)
+
+def profile_bucket(profile) -> str:
+    # Only coarse, shared profile fields take part in the key so that students
+    # at the same level can share answers without leaking per-user state.
+    if profile is None:
+        return "-"
+    return f"{profile.knowledge_level}|{profile.explanation_preference}"
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+class CacheEntry:
+    def __init__(self, embedding: List[float], response: str):
+        self.embedding = embedding
+        self.response = response
+        self.created_at = time.monotonic()
+
+class SemanticResponseCache:
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_entries: int = 512):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (template, context fingerprint, profile bucket) -> {entry_id: CacheEntry}
+        self._partitions: dict = {}
+        # entry_id -> partition key, in LRU order
+        self._lru: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remove(self, entry_id: int):
+        key = self._lru.pop(entry_id, None)
+        partition = self._partitions.get(key)
+        if partition is not None:
+            partition.pop(entry_id, None)
+            if not partition:
+                del self._partitions[key]
+
+    def lookup(self, template: str, context: str, bucket: str, embedding: List[float]) -> Optional[str]:
+        key = (template, fingerprint(context), bucket)
+        partition = self._partitions.get(key, {})
+        now = time.monotonic()
+        best_id, best_score = None, self.threshold
+        for entry_id, entry in list(partition.items()):
+            if now - entry.created_at > self.ttl:
+                self._remove(entry_id)
+                continue
+            score = _cosine(embedding, entry.embedding)
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+
+        if best_id is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._lru.move_to_end(best_id)
+        logger.info(f"Response cache hit (template: {template}, similarity: {best_score:.3f})")
+        return self._partitions[key][best_id].response
+
+    def store(self, template: str, context: str, bucket: str, embedding: List[float], response: str):
+        if not response:
+            return
+        key = (template, fingerprint(context), bucket)
+        entry_id = self._next_id
+        self._next_id += 1
+        self._partitions.setdefault(key, {})[entry_id] = CacheEntry(embedding, response)
+        self._lru[entry_id] = key
+        while len(self._lru) > self.max_entries:
+            oldest_id = next(iter(self._lru))
+            self._remove(oldest_id)
+            self.evictions += 1
+
+    def clear(self):
+        self._partitions.clear()
+        self._lru.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": settings.RESPONSE_CACHE_ENABLED,
+            "entries": len(self._lru),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+def iter_cached_chunks(text: str, chunk_size: int = 16):
+    # Replay a cached answer in small pieces so streaming clients render it as usual
+    for i in range(0, len(text), chunk_size):
+        yield text[i:i + chunk_size]
+
+response_cache = SemanticResponseCache(
+    threshold=settings.RESPONSE_CACHE_THRESHOLD,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    max_entries=settings.RESPONSE_CACHE_SIZE
+)
@@ -0,0 +1,152 @@
+import time
+import asyncio
+import logging
+import threading
+from typing import List
+from app.llm.ollama_client import get_ollama_llm
+from app.llm.prompts import SUMMARY_PROMPT
+from app.llm.prompt_budget import estimate_tokens, truncate_to_tokens
+from app.llm.scheduler import llm_scheduler, Priority
+from app.llm.metrics import llm_metrics
+from app.memory.history import ChatMessage, get_messages_since
+from app.memory.session_index import get_session_index
+from app.memory.summary import load_user_summary, save_user_summary
+from app.memory.profile_store import DEFAULT_SUMMARY
+
+logger = logging.getLogger(__name__)
+
+class RollingSummarizer:
+    """Folds chat turns that have left the conversation window into the user's summary.
+
+    Each session keeps a checkpoint of how many of its messages are already
+    in the summary, so a run only sends the messages past it, at most
+    ``input_tokens`` of them per LLM call, and the summary never grows past
+    ``max_tokens``. Runs start once ``batch_turns`` turns are waiting and
+    execute in the background, one at a time per user.
+    """
+
+    def __init__(self, window_messages: int, batch_turns: int = 4, input_tokens: int = 1500,
+                 max_tokens: int = 300, enabled: bool = True):
+        self.llm = get_ollama_llm("summarize", temperature=0)
+        self.window_messages = window_messages
+        self.batch_messages = batch_turns * 2
+        self.input_tokens = input_tokens
+        self.max_tokens = max_tokens
+        self.enabled = enabled
+        self._running = {}
+        # Sessions with new turns that arrived while a run was in flight
+        self._again = {}
+        # Bumped by discard; a run only saves while its user's generation is unchanged
+        self._generations = {}
+        self._save_lock = threading.Lock()
+        self.runs = 0
+        self.messages_folded = 0
+        self.failures = 0
+
+    async def note_turn(self, user_id: str, session_id: str, message_count: int):
+        if not self.enabled:
+            return
+        if user_id in self._running:
+            self._again[user_id] = session_id
+            return
+        folded = await asyncio.to_thread(get_session_index().get_summary_checkpoint, user_id, session_id)
+        if message_count - self.window_messages - folded < self.batch_messages:
+            return
+        if user_id in self._running:
+            self._again[user_id] = session_id
+            return
+        task = self._running[user_id] = asyncio.create_task(self._run(user_id, session_id))
+        task.add_done_callback(lambda t: self._finished(user_id, t))
+
+    def _finished(self, user_id: str, task: asyncio.Task):
+        # A reset may already have replaced this run with a newer one
+        if self._running.get(user_id) is task:
+            del self._running[user_id]
+
+    async def _run(self, user_id: str, session_id: str):
+        try:
+            while session_id is not None:
+                await self._fold(user_id, session_id)
+                session_id = self._again.pop(user_id, None)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Summary update failed for {user_id}: {e}")
+
+    async def _fold(self, user_id: str, session_id: str):
+        generation = self._generations.get(user_id, 0)
+        index = get_session_index()
+        folded = await asyncio.to_thread(index.get_summary_checkpoint, user_id, session_id)
+        messages, total = await asyncio.to_thread(get_messages_since, user_id, session_id, folded)
+        pending = messages[:max(total - self.window_messages - folded, 0)]
+        position = 0
+        while position < len(pending):
+            chunk, used = [], 0
+            for i, message in enumerate(pending[position:]):
+                tokens = min(estimate_tokens(message.content), self.input_tokens)
+                # Only split between turns, never between a question and its answer
+                if chunk and i % 2 == 0 and used + tokens > self.input_tokens:
+                    break
+                chunk.append(message)
+                used += tokens
+            summary = await asyncio.to_thread(load_user_summary, user_id)
+            summary = await self._summarize(user_id, summary, chunk)
+            position += len(chunk)
+            if not await asyncio.to_thread(self._save, user_id, generation, session_id, summary, folded + position):
+                return
+            self.runs += 1
+            self.messages_folded += len(chunk)
+        logger.info(f"Summary for {user_id} covers {folded + position} messages of session {session_id}")
+
+    def _save(self, user_id: str, generation: int, session_id: str, summary: str, folded: int) -> bool:
+        # Runs in a worker thread, where cancelling the task no longer reaches it
+        with self._save_lock:
+            if self._generations.get(user_id, 0) != generation:
+                return False
+            # A crash between these two writes only folds the same turns in twice
+            save_user_summary(user_id, summary)
+            get_session_index().set_summary_checkpoint(user_id, session_id, folded)
+            return True
+
+    async def _summarize(self, user_id: str, summary: str, messages: List[ChatMessage]) -> str:
+        turns = "\n".join(
+            f"{'User' if m.role == 'user' else 'Assistant'}: {truncate_to_tokens(m.content, self.input_tokens)}"
+            for m in messages
+        )
+        prompt = SUMMARY_PROMPT.format(
+            summary="None yet." if summary == DEFAULT_SUMMARY else summary,
+            turns=turns,
+            # Roughly three words for every four tokens
+            max_words=self.max_tokens * 3 // 4
+        )
+        async with llm_scheduler.slot(Priority.BACKGROUND, user_id):
+            started = time.perf_counter()
+            response = await self.llm.ainvoke(prompt)
+            latency = time.perf_counter() - started
+        llm_metrics.record("summarize", response.response_metadata, estimate_tokens(prompt), latency=latency)
+        content = (response.content or "").strip()
+        if not content:
+            raise ValueError("empty summary")
+        return truncate_to_tokens(content, self.max_tokens)
+
+    def discard(self, user_id: str):
+        # Used on reset: the summary being written is about to be cleared.
+        # Waits out a save already in progress so it cannot land after the clear.
+        with self._save_lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        self._again.pop(user_id, None)
+        task = self._running.pop(user_id, None)
+        if task is not None:
+            task.cancel()
+
+    async def drain(self):
+        if self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": len(self._running),
+            "runs": self.runs,
+            "messages_folded": self.messages_folded,
+            "failures": self.failures,
+        }
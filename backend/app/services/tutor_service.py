@@ -1,13 +1,19 @@
-from app.memory.user_profile import load_user_profile
-from app.memory.summary import load_user_summary, save_user_summary
+from app.memory.user_state import user_state
+from app.memory.summary import load_user_summary, save_user_summary, clear_user_summary
+from app.memory.profile_store import DEFAULT_SUMMARY
 from app.memory.history import clear_history
 from app.vectorstore.retriever import retrieve_context
-from app.services.gap_detector import GapDetector
+from app.services.gap_detector import GapDetector, GapDetectionBatcher
+from app.services.summarizer import RollingSummarizer
 from app.agents.study_agent import StudyAgent
 from app.services.assessment_service import AssessmentService
 from app.api.upload import get_user_uploaded_content, clear_user_uploaded_content
+from app.services.response_cache import response_cache, profile_bucket, iter_cached_chunks, STUDY_TEMPLATE
+from app.vectorstore.chroma_client import get_embeddings
+from app.config import settings
 from fastapi import BackgroundTasks
 
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,17 +23,31 @@ class TutorService:
         self.agent = StudyAgent()
         self.assessment_service = AssessmentService()
         self.gap_detector = GapDetector()
+        self.gap_batcher = GapDetectionBatcher(
+            self.gap_detector,
+            max_turns=settings.GAP_BATCH_TURNS,
+            idle_seconds=settings.GAP_BATCH_IDLE_SECONDS
+        )
+        self.summarizer = RollingSummarizer(
+            window_messages=settings.MEMORY_LIMIT * 2,
+            batch_turns=settings.SUMMARY_BATCH_TURNS,
+            input_tokens=settings.SUMMARY_INPUT_TOKENS,
+            max_tokens=settings.SUMMARY_MAX_TOKENS,
+            enabled=settings.SUMMARY_ENABLED
+        )
 
     async def reset_user(self, user_id: str):
         try:
             import uuid
-            from app.memory.user_profile import UserProfile, save_user_profile
+            from app.memory.user_profile import UserProfile
             
-            # 1. Clear in-memory history
+            # 1. Clear in-memory history and any turns awaiting gap detection or summarization
             self.agent.clear_memory(user_id)
+            self.gap_batcher.discard(user_id)
+            self.summarizer.discard(user_id)
             
             # 2. Clear on-disk history
-            clear_history(user_id)
+            await asyncio.to_thread(clear_history, user_id)
             
             # 3. Initialize fresh empty state
             new_profile = UserProfile(
@@ -38,14 +58,10 @@ class TutorService:
                 weak_areas=[],
                 known_concepts=[]
             )
-            save_user_profile(new_profile)
+            await user_state.replace(new_profile)
             
             # 4. Clear summary
-            import os
-            from app.config import settings
-            summary_path = os.path.join(settings.USER_DATA_PATH, f"{user_id}_summary.txt")
-            if os.path.exists(summary_path):
-                os.remove(summary_path)
+            await asyncio.to_thread(clear_user_summary, user_id)
                 
             # 5. Clear uploaded file content
             clear_user_uploaded_content(user_id)
@@ -55,28 +71,54 @@ class TutorService:
             logger.error(f"Error resetting user {user_id}: {e}")
             return False
 
+    async def _lookup_cached_response(self, user_id: str, session_id: str, message: str, context: str, profile,
+                                      summary: str, is_file_context: bool):
+        # Uploaded files are private to the user, so those answers are never shared
+        if not settings.RESPONSE_CACHE_ENABLED or is_file_context:
+            return None, None
+        # The key has no room for per-user conversation state, so only a fresh
+        # conversation may share answers; follow-ups always go to the model
+        if (summary and summary != DEFAULT_SUMMARY) or await self.agent.conversations.history(user_id, session_id):
+            return None, None
+        try:
+            embedding = await get_embeddings().aembed_query(message)
+        except Exception as e:
+            logger.warning(f"Skipping response cache, embedding failed: {e}")
+            return None, None
+        cached = response_cache.lookup(STUDY_TEMPLATE, context, profile_bucket(profile), embedding)
+        return embedding, cached
+
     async def _background_tasks(self, user_id: str, message: str, history: str, profile, session_id: str, output: str):
         try:
-            # 1. Detect Gaps and Update Profile
-            await self.gap_detector.analyze_and_update(user_id, message, history, profile)
+            # 1. Queue the turn for batched gap detection
+            try:
+                await self.gap_batcher.add_turn(user_id, session_id, message, output)
+            except Exception as e:
+                # Still append the turn below, or the pinned conversation window is never released
+                logger.error(f"Error queueing gap detection: {e}")
             
-            # 2. Save Session History
-            from app.memory.history import SessionHistory, ChatMessage, save_session_history
-            from datetime import datetime
+            # 2. Append the turn to the session log. Its mastery snapshot is the
+            # profile as of this turn, which does not yet include the gap
+            # analysis of up to GAP_BATCH_TURNS queued turns (this one
+            # included); those land in the snapshot of the turn after the flush.
+            from app.memory.history import ChatMessage, append_session_turn
             
-            session = SessionHistory(
-                session_id=session_id,
-                user_id=user_id,
-                messages=[
-                    ChatMessage(role="user", content=message),
-                    ChatMessage(role="assistant", content=output)
-                ],
-                mastered_concepts=profile.known_concepts,
-                weak_areas=profile.weak_areas,
-                topic_mastery=profile.topic_mastery,
-                created_at=datetime.now()
-            )
-            save_session_history(session)
+            try:
+                message_count = await asyncio.to_thread(
+                    append_session_turn,
+                    user_id,
+                    session_id,
+                    [ChatMessage(role="user", content=message), ChatMessage(role="assistant", content=output)],
+                    list(profile.known_concepts),
+                    list(profile.weak_areas),
+                    dict(profile.topic_mastery)
+                )
+            finally:
+                # The conversation window may be evicted again now
+                self.agent.conversations.persisted(user_id, session_id)
+
+            # 3. Fold turns that have left the conversation window into the summary
+            await self.summarizer.note_turn(user_id, session_id, message_count)
         except Exception as e:
             logger.error(f"Error in background tasks: {e}")
 
@@ -84,11 +126,11 @@ class TutorService:
         try:
             import asyncio
             # Load user context and retrieve materials in parallel
-            profile_task = asyncio.to_thread(load_user_profile, user_id)
+            profile_task = user_state.get(user_id)
             summary_task = asyncio.to_thread(load_user_summary, user_id)
             
             # Check for uploaded content
-            uploaded_content = get_user_uploaded_content(user_id)
+            uploaded_content = await get_user_uploaded_content(user_id, message)
             
             if uploaded_content:
                 context = uploaded_content
@@ -103,21 +145,34 @@ class TutorService:
                     )
                 except asyncio.TimeoutError:
                     logger.error(f"Timeout gathering context for user {user_id}")
-                    profile = load_user_profile(user_id)
+                    profile = await user_state.get(user_id)
                     summary = ""
                     context = ""
             
+            cache_embedding, cached = await self._lookup_cached_response(
+                user_id, session_id, message, context, profile, summary, bool(uploaded_content)
+            )
+
             full_output = ""
-            async for chunk in self.agent.stream(
-                user_id=user_id,
-                input_text=message,
-                profile=profile,
-                summary=summary,
-                context=context,
-                is_file_context=bool(uploaded_content)
-            ):
-                full_output += chunk
-                yield chunk
+            if cached:
+                for chunk in iter_cached_chunks(cached):
+                    full_output += chunk
+                    yield chunk
+                await self.agent.remember(user_id, message, full_output, session_id)
+            else:
+                async for chunk in self.agent.stream(
+                    user_id=user_id,
+                    input_text=message,
+                    profile=profile,
+                    summary=summary,
+                    context=context,
+                    is_file_context=bool(uploaded_content),
+                    session_id=session_id
+                ):
+                    full_output += chunk
+                    yield chunk
+                if cache_embedding is not None:
+                    response_cache.store(STUDY_TEMPLATE, context, profile_bucket(profile), cache_embedding, full_output)
 
             # After streaming finishes, run background tasks
             history = f"User: {message}\nAssistant: {full_output}"
@@ -135,11 +190,11 @@ class TutorService:
         try:
             import asyncio
             # 1 & 2. Load User Context and Retrieve Relevant Materials in parallel
-            profile_task = asyncio.to_thread(load_user_profile, user_id)
+            profile_task = user_state.get(user_id)
             summary_task = asyncio.to_thread(load_user_summary, user_id)
             
             # Check for uploaded content
-            uploaded_content = get_user_uploaded_content(user_id)
+            uploaded_content = await get_user_uploaded_content(user_id, message)
             
             if uploaded_content:
                 context = uploaded_content
@@ -154,22 +209,33 @@ class TutorService:
                     )
                 except asyncio.TimeoutError:
                     logger.error(f"Timeout gathering context for user {user_id}")
-                    profile = load_user_profile(user_id)
+                    profile = await user_state.get(user_id)
                     summary = ""
                     context = ""
             
-            # 3. Get Agent Response
-            response = await self.agent.run(
-                user_id=user_id,
-                input_text=message,
-                profile=profile,
-                summary=summary,
-                context=context,
-                is_file_context=bool(uploaded_content)
+            # 3. Get Agent Response (or a semantically equivalent cached one)
+            cache_embedding, cached = await self._lookup_cached_response(
+                user_id, session_id, message, context, profile, summary, bool(uploaded_content)
             )
-            
-            output = response["output"]
-            history = response.get("history", "")
+            if cached:
+                await self.agent.remember(user_id, message, cached, session_id)
+                output = cached
+                history = f"User: {message}\nAssistant: {cached}"
+            else:
+                response = await self.agent.run(
+                    user_id=user_id,
+                    input_text=message,
+                    profile=profile,
+                    summary=summary,
+                    context=context,
+                    is_file_context=bool(uploaded_content),
+                    session_id=session_id
+                )
+
+                output = response["output"]
+                history = response.get("history", "")
+                if cache_embedding is not None:
+                    response_cache.store(STUDY_TEMPLATE, context, profile_bucket(profile), cache_embedding, output)
 
             # Schedule background work
             if background_tasks:
@@ -3,13 +3,31 @@ from chromadb.config import Settings as ChromaSettings
 from langchain_chroma import Chroma
 from langchain_ollama import OllamaEmbeddings
 from app.config import settings
+from app.vectorstore.embedding_cache import CachedEmbeddings
+from app.llm.http_pool import ollama_client_kwargs
 from functools import lru_cache
 
 @lru_cache()
 def get_embeddings():
-    return OllamaEmbeddings(
+    embeddings = OllamaEmbeddings(
         model=settings.EMBEDDING_MODEL,
-        base_url=settings.OLLAMA_BASE_URL
+        base_url=settings.OLLAMA_BASE_URL,
+        **ollama_client_kwargs()
+    )
+    # Repeated queries (e.g. the same topic for a whole class) skip the Ollama round-trip
+    return CachedEmbeddings(
+        embeddings,
+        model_name=settings.EMBEDDING_MODEL,
+        memory_size=settings.EMBEDDING_CACHE_SIZE,
+        disk_path=settings.EMBEDDING_CACHE_PATH,
+        disk_size=settings.EMBEDDING_CACHE_DISK_SIZE
+    )
+
+def create_vectorstore(embedding_function) -> Chroma:
+    return Chroma(
+        persist_directory=settings.CHROMA_PATH,
+        embedding_function=embedding_function,
+        collection_name="study_materials"
     )
 
 _vectorstore = None
@@ -17,10 +35,5 @@ _vectorstore = None
 def get_chroma_client():
     global _vectorstore
     if _vectorstore is None:
-        embeddings = get_embeddings()
-        _vectorstore = Chroma(
-            persist_directory=settings.CHROMA_PATH,
-            embedding_function=embeddings,
-            collection_name="study_materials"
-        )
+        _vectorstore = create_vectorstore(get_embeddings())
     return _vectorstore
@@ -0,0 +1,177 @@
+import os
+import time
+import array
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: str) -> str:
+    # Collapse whitespace only; casing can change the embedding
+    return " ".join(text.split())
+
+class EmbeddingCacheStats:
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+    def to_dict(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_evictions": self.memory_evictions,
+            "disk_evictions": self.disk_evictions,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+class DiskEmbeddingCache:
+    def __init__(self, path: str, max_entries: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        vector = array.array("d")
+        vector.frombytes(row[0])
+        return vector.tolist()
+
+    def put(self, key: str, vector: List[float]) -> int:
+        blob = array.array("d", vector).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                (key, blob, time.time())
+            )
+            # Evict least recently used rows once over the bound
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            evicted = 0
+            if count > self.max_entries:
+                evicted = count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (evicted,)
+                )
+            self._conn.commit()
+        return evicted
+
+class CachedEmbeddings(Embeddings):
+    """Query-embedding cache with an in-process LRU tier backed by a SQLite tier.
+
+    Document embeddings (ingestion) pass straight through to the wrapped model.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, memory_size: int = 1024,
+                 disk_path: Optional[str] = None, disk_size: int = 50000):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.memory_size = memory_size
+        self.stats = EmbeddingCacheStats()
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        if disk_path and disk_size > 0:
+            try:
+                self._disk = DiskEmbeddingCache(disk_path, disk_size)
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding disk cache unavailable at {disk_path}: {e}")
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{digest}"
+
+    def _get_memory(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+            return vector
+
+    def _put_memory(self, key: str, vector: List[float]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+                self.stats.memory_evictions += 1
+
+    def _get_disk(self, key: str) -> Optional[List[float]]:
+        if self._disk is None:
+            return None
+        try:
+            vector = self._disk.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding disk cache read failed: {e}")
+            return None
+        if vector is not None:
+            self.stats.disk_hits += 1
+            self._put_memory(key, vector)
+        return vector
+
+    def _store(self, key: str, vector: List[float]):
+        self._put_memory(key, vector)
+        if self._disk is None:
+            return
+        try:
+            self.stats.disk_evictions += self._disk.put(key, vector)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding disk cache write failed: {e}")
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self._get_memory(key) or self._get_disk(key)
+        if vector is not None:
+            return vector
+        self.stats.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self._store(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        import asyncio
+        key = self._key(text)
+        vector = self._get_memory(key)
+        if vector is None and self._disk is not None:
+            vector = await asyncio.to_thread(self._get_disk, key)
+        if vector is not None:
+            return vector
+        self.stats.misses += 1
+        vector = await self.embeddings.aembed_query(text)
+        await asyncio.to_thread(self._store, key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def get_stats(self) -> dict:
+        stats = self.stats.to_dict()
+        stats["memory_entries"] = len(self._memory)
+        return stats
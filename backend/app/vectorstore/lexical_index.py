@@ -0,0 +1,129 @@
+import os
+import re
+import math
+import sqlite3
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import List, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._+-][a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    # Keeps dotted and hyphenated identifiers like "f1-score", "k-means" or "log2.5" intact
+    return TOKEN_PATTERN.findall(text.lower())
+
+class LexicalIndex:
+    """Persistent BM25 inverted index over the study_materials chunks.
+
+    Postings live in SQLite next to the Chroma store so the ingest script and
+    the API process share them; queries are served from an in-memory copy that
+    is reloaded whenever the database file changes on disk.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+        # (postings, doc_lengths, contents, avg_length), swapped as one so
+        # searches in other threads never see half of a reload
+        self._snapshot = ({}, {}, {}, 0.0)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, source TEXT, content TEXT NOT NULL, length INTEGER NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks(source)")
+            conn.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, chunk_id))")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings(chunk_id)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def add(self, ids: List[str], texts: List[str], sources: List[str]):
+        with self._connect() as conn:
+            self._delete_ids(conn, ids)
+            for chunk_id, text, source in zip(ids, texts, sources):
+                counts = Counter(tokenize(text))
+                conn.execute(
+                    "INSERT INTO chunks (id, source, content, length) VALUES (?, ?, ?, ?)",
+                    (chunk_id, source, text, sum(counts.values()))
+                )
+                conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in counts.items()]
+                )
+
+    def _delete_ids(self, conn, ids: List[str]):
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            marks = ",".join("?" * len(batch))
+            conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({marks})", batch)
+            conn.execute(f"DELETE FROM chunks WHERE id IN ({marks})", batch)
+
+    def delete(self, ids: List[str] = None, source: str = None):
+        with self._connect() as conn:
+            if source is not None:
+                ids = [row[0] for row in conn.execute("SELECT id FROM chunks WHERE source = ?", (source,))]
+            if ids:
+                self._delete_ids(conn, ids)
+
+    def load(self):
+        # Blocking SQLite read: call at startup or from a worker thread
+        try:
+            mtime = max(os.path.getmtime(p) for p in (self.path, f"{self.path}-wal") if os.path.exists(p))
+        except ValueError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        with self._lock:
+            if mtime == self._loaded_mtime:
+                return
+            postings = defaultdict(dict)
+            doc_lengths, contents = {}, {}
+            conn = self._connect()
+            try:
+                for chunk_id, content, length in conn.execute("SELECT id, content, length FROM chunks"):
+                    doc_lengths[chunk_id] = length
+                    contents[chunk_id] = content
+                for term, chunk_id, tf in conn.execute("SELECT term, chunk_id, tf FROM postings"):
+                    postings[term][chunk_id] = tf
+            finally:
+                conn.close()
+            avg_length = (sum(doc_lengths.values()) / len(doc_lengths)) if doc_lengths else 0.0
+            self._snapshot = (dict(postings), doc_lengths, contents, avg_length)
+            self._loaded_mtime = mtime
+            logger.info(f"Loaded lexical index ({len(doc_lengths)} chunks, {len(postings)} terms)")
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[str, float]]:
+        self.load()
+        all_postings, doc_lengths, contents, avg_length = self._snapshot
+        n_docs = len(doc_lengths)
+        if not n_docs:
+            return []
+
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = all_postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * doc_lengths[chunk_id] / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(contents[chunk_id], score) for chunk_id, score in ranked]
+
+_lexical_index = None
+
+def get_lexical_index():
+    global _lexical_index
+    if _lexical_index is None:
+        _lexical_index = LexicalIndex(os.path.join(settings.CHROMA_PATH, "lexical_index.sqlite3"))
+    return _lexical_index
@@ -1,9 +1,49 @@
+import asyncio
+import logging
+from app.config import settings
 from app.vectorstore.chroma_client import get_chroma_client
+from app.vectorstore.lexical_index import get_lexical_index
 
-async def retrieve_context(query: str, k: int = 3):
-    if not query.strip():
-        return ""
-        
+logger = logging.getLogger(__name__)
+
+RRF_K = 60
+
+def _lexical_search(query: str, k: int):
+    return [content for content, _ in get_lexical_index().search(query, k=k)]
+
+async def _vector_search(query: str, k: int):
     vectorstore = get_chroma_client()
     docs = await vectorstore.asimilarity_search(query, k=k)
-    return "\n\n".join([doc.page_content for doc in docs])
+    return [doc.page_content for doc in docs]
+
+def _fuse(rankings, k: int):
+    # Reciprocal rank fusion: robust to BM25 and cosine scores living on different scales
+    scores = {}
+    for ranking in rankings:
+        for rank, content in enumerate(ranking):
+            scores[content] = scores.get(content, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+async def retrieve_context(query: str, k: int = 3, mode: str = None):
+    if not query.strip():
+        return ""
+
+    mode = mode or settings.RETRIEVAL_MODE
+    if mode == "lexical":
+        return "\n\n".join(await asyncio.to_thread(_lexical_search, query, k))
+
+    lexical = await asyncio.to_thread(_lexical_search, query, k * 2) if mode == "hybrid" else []
+    try:
+        vector = await asyncio.wait_for(_vector_search(query, k * 2 if lexical else k), timeout=settings.VECTOR_SEARCH_TIMEOUT)
+    except asyncio.TimeoutError:
+        # Embedding service is slow or saturated: serve the lexical fast path instead
+        logger.warning(f"Vector search timed out after {settings.VECTOR_SEARCH_TIMEOUT}s, falling back to lexical retrieval")
+        return "\n\n".join(lexical[:k] if lexical else await asyncio.to_thread(_lexical_search, query, k))
+    except Exception as e:
+        # Chroma or the embedding model is down: same fallback
+        logger.warning(f"Vector search failed ({e}), falling back to lexical retrieval")
+        return "\n\n".join(lexical[:k] if lexical else await asyncio.to_thread(_lexical_search, query, k))
+
+    if mode == "hybrid":
+        return "\n\n".join(_fuse([vector, lexical], k))
+    return "\n\n".join(vector)
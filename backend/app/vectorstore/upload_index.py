@@ -0,0 +1,79 @@
+import math
+import time
+import logging
+from typing import Dict, List
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.config import settings
+from app.vectorstore.chroma_client import get_embeddings
+
+logger = logging.getLogger(__name__)
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else vector
+
+class UserUploads:
+    def __init__(self):
+        # filename -> (chunks, unit-length vectors)
+        self.files: Dict[str, tuple] = {}
+        self.touched_at = time.monotonic()
+
+    def touch(self):
+        self.touched_at = time.monotonic()
+
+class UploadIndex:
+    """Per-user, in-memory chunk index for uploaded files, evicted after a TTL of inactivity."""
+
+    def __init__(self, ttl: float = 7200, chunk_size: int = 1000, chunk_overlap: int = 100):
+        self.ttl = ttl
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self._users: Dict[str, UserUploads] = {}
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for user_id in [u for u, uploads in self._users.items() if now - uploads.touched_at > self.ttl]:
+            logger.info(f"Evicting uploaded file index for user {user_id} (idle > {self.ttl}s)")
+            del self._users[user_id]
+
+    async def add_file(self, user_id: str, filename: str, text: str) -> int:
+        chunks = [c for c in self.splitter.split_text(text) if c.strip()]
+        vectors = await get_embeddings().aembed_documents(chunks) if chunks else []
+        self._evict_expired()
+        uploads = self._users.setdefault(user_id, UserUploads())
+        uploads.files[filename] = (chunks, [_normalize(v) for v in vectors])
+        uploads.touch()
+        return len(chunks)
+
+    def has_uploads(self, user_id: str) -> bool:
+        self._evict_expired()
+        return user_id in self._users
+
+    async def retrieve(self, user_id: str, query: str, k: int = 3) -> str:
+        self._evict_expired()
+        uploads = self._users.get(user_id)
+        if uploads is None:
+            return ""
+        uploads.touch()
+
+        chunks, vectors = [], []
+        for file_chunks, file_vectors in uploads.files.values():
+            chunks.extend(file_chunks)
+            vectors.extend(file_vectors)
+        if len(chunks) <= k or not query.strip():
+            return "\n\n".join(chunks[:k])
+
+        try:
+            query_vector = _normalize(await get_embeddings().aembed_query(query))
+        except Exception as e:
+            logger.warning(f"Query embedding failed for uploaded content, using leading chunks: {e}")
+            return "\n\n".join(chunks[:k])
+
+        scores = [sum(q * v for q, v in zip(query_vector, vector)) for vector in vectors]
+        top = sorted(range(len(chunks)), key=scores.__getitem__, reverse=True)[:k]
+        # Keep document order so neighbouring chunks read naturally
+        return "\n\n".join(chunks[i] for i in sorted(top))
+
+    def clear(self, user_id: str):
+        self._users.pop(user_id, None)
+
+upload_index = UploadIndex(ttl=settings.UPLOAD_TTL)
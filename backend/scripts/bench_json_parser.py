@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+# Add the parent directory to sys.path to allow importing from 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from app.llm.structured_output import structured_output
+
+# Hand-built samples, in the formats the app's prompts ask for, of the malformed
+# shapes small models produce. They are not real model outputs; record those
+# with capture_llm_json_corpus.py and pass the resulting file with --corpus.
+DEFAULT_CORPUS = os.path.join(current_dir, "data", "llm_json_corpus_synthetic.jsonl")
+
+# Each sample is parsed and validated with the structured output task of the service that owns it
+TASKS = {
+    "mcq": "mcq_gen",
+    "qa": "qa_gen",
+    "gap": "gap_detect_batch",
+    "grade": "grade",
+}
+
+def load_corpus(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def count_valid(result) -> int:
+    # Only items that validated against the task's model count
+    if result is None:
+        return 0
+    return len(result) if isinstance(result, list) else 1
+
+def run(corpus_path: str, iterations: int, show_failures: bool):
+    # Failed samples would log a warning on every timed iteration
+    logging.getLogger("app.llm.structured_output").setLevel(logging.ERROR)
+    samples = load_corpus(corpus_path)
+    real = sum(1 for s in samples if s.get("source", "").startswith("ollama:"))
+    print(f"{corpus_path}: {len(samples)} samples, {real} captured from a real model, {len(samples) - real} synthetic")
+    per_task = {}
+    total_bytes = 0
+    total_seconds = 0.0
+
+    for sample in samples:
+        task = TASKS[sample["task"]]
+        text = sample["text"]
+        size = len(text.encode("utf-8"))
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            result = structured_output.parse(task, text)
+        elapsed = (time.perf_counter() - started) / iterations
+
+        found = count_valid(result)
+        ok = found == sample["expected"]
+        stats = per_task.setdefault(sample["task"], {"samples": 0, "ok": 0, "bytes": 0, "seconds": 0.0})
+        stats["samples"] += 1
+        stats["ok"] += ok
+        stats["bytes"] += size
+        stats["seconds"] += elapsed
+        total_bytes += size
+        total_seconds += elapsed
+
+        if show_failures and not ok:
+            print(f"FAIL [{sample['task']}] {sample.get('note', '')}: expected {sample['expected']} valid, got {found}")
+
+    print(f"{'task':<8}{'samples':>9}{'success':>10}{'us/KB':>10}")
+    for task, stats in sorted(per_task.items()):
+        rate = stats["ok"] / stats["samples"]
+        us_per_kb = stats["seconds"] * 1e6 / (stats["bytes"] / 1024)
+        print(f"{task:<8}{stats['samples']:>9}{rate:>10.1%}{us_per_kb:>10.1f}")
+
+    ok = sum(s["ok"] for s in per_task.values())
+    print(f"{'total':<8}{len(samples):>9}{ok / len(samples):>10.1%}{total_seconds * 1e6 / (total_bytes / 1024):>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LLM JSON extraction against a corpus of model outputs")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSONL file with task, text, expected count of valid items and optional source")
+    parser.add_argument("--iterations", type=int, default=200, help="Parses per sample when timing")
+    parser.add_argument("--show-failures", action="store_true", help="Print samples that did not parse as expected")
+    args = parser.parse_args()
+    run(args.corpus, args.iterations, args.show_failures)
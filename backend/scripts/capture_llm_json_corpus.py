@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+# Add the parent directory to sys.path to allow importing from 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from app.config import settings
+from app.llm.ollama_client import get_ollama_llm
+from app.llm.structured_output import structured_output
+from app.llm.prompts import MCQ_GENERATION_PROMPT, QA_GENERATION_PROMPT, GRADING_PROMPT, GAP_DETECTOR_BATCH_PROMPT
+
+DEFAULT_OUTPUT = os.path.join(current_dir, "data", "llm_json_corpus_ollama.jsonl")
+
+def build_prompts(topic: str) -> list:
+    # (task, routed task, prompt, expected valid item count) with the prompts the services send
+    turns = (
+        f"Turn 1:\nUser: What is {topic}?\nAssistant: A short explanation of {topic}.\n\n"
+        f"Turn 2:\nUser: I still don't get why it matters.\nAssistant: An example of where {topic} is used."
+    )
+    return [
+        ("mcq", "mcq_gen", MCQ_GENERATION_PROMPT.format(count=3, topics=topic, context=""), 3),
+        ("qa", "qa_gen", QA_GENERATION_PROMPT.format(count=2, size="medium", topics=topic, context=""), 2),
+        ("grade", "grade", GRADING_PROMPT.format(
+            question=f"Explain {topic}.", key_points=f"definition of {topic}; one example",
+            user_answer=f"{topic} is something used in science, for example in class."
+        ), 1),
+        ("gap", "gap_detect_batch", GAP_DETECTOR_BATCH_PROMPT.format(count=2, turns=turns), 2),
+    ]
+
+async def capture(topics: list, output: str, structured: bool):
+    structured_output.enabled = structured
+    written = 0
+    with open(output, "a", encoding="utf-8") as f:
+        for topic in topics:
+            for task, route, prompt, expected in build_prompts(topic):
+                model_task = "gap_detect" if route == "gap_detect_batch" else route
+                llm = structured_output.bind(get_ollama_llm(model_task, temperature=0.7), route)
+                try:
+                    response = await llm.ainvoke(prompt)
+                except Exception as e:
+                    print(f"Skipping {task} for {topic}: {e}")
+                    continue
+                record = {
+                    "task": task,
+                    "note": f"{topic} ({'structured' if structured else 'free-form'})",
+                    "source": f"ollama:{settings.route(model_task)['model']}",
+                    "expected": expected,
+                    "text": response.content,
+                }
+                f.write(json.dumps(record) + "\n")
+                written += 1
+    print(f"Appended {written} real model outputs to {output}")
+    print("Check the expected counts by hand: they count items that should validate, and a model may legitimately return fewer questions than asked.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record real Ollama responses for the JSON parser benchmark corpus")
+    parser.add_argument("topics", nargs="+", help="Topics to generate questions, grades and gap analyses for")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSONL file to append to")
+    parser.add_argument("--structured", action="store_true", help="Send the JSON schema as Ollama's format, as the services do")
+    args = parser.parse_args()
+    asyncio.run(capture(args.topics, args.output, args.structured))
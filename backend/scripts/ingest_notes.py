@@ -1,6 +1,12 @@
 import os
+import json
+import time
+import queue
+import hashlib
 import argparse
+import threading
 import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
 # Add the parent directory to sys.path to allow importing from 'app'
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -8,32 +14,115 @@ parent_dir = os.path.dirname(current_dir)
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
-from app.vectorstore.chroma_client import get_chroma_client
+from app.config import settings
+from app.vectorstore.chroma_client import create_vectorstore, get_chroma_client, get_embeddings
+from app.vectorstore.lexical_index import get_lexical_index
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import TextLoader, PyPDFLoader
+from langchain_core.embeddings import Embeddings
 
-def ingest_path(path: str):
-    if not os.path.exists(path):
-        print(f"Path {path} not found.")
-        return
+SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.doc', '.txt', '.md']
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.chunks = 0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, chunks: int):
+        now = time.perf_counter()
+        with self._lock:
+            if self.started is None:
+                self.started = now
+            self.chunks += chunks
+            self.finished = now
+
+    def start(self):
+        with self._lock:
+            if self.started is None:
+                self.started = time.perf_counter()
+
+    def report(self) -> str:
+        elapsed = (self.finished - self.started) if self.started and self.finished else 0.0
+        rate = self.chunks / elapsed if elapsed > 0 else 0.0
+        return f"{self.name:<6} {self.chunks:>7} chunks in {elapsed:8.2f}s ({rate:8.1f} chunks/s)"
+
+class PrecomputedEmbeddings(Embeddings):
+    """Serves the embed stage's vectors to ``Chroma.add_texts`` so the writer does not embed again.
+
+    Texts without a precomputed vector, and queries, go to the wrapped embeddings.
+    """
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self.vectors = {}
+
+    def embed_documents(self, texts):
+        missing = [text for text in texts if text not in self.vectors]
+        computed = dict(zip(missing, self.embeddings.embed_documents(missing))) if missing else {}
+        return [self.vectors[text] if text in self.vectors else computed[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+class IngestManifest:
+    """Per-file record of size, mtime, content hash and produced chunk IDs."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+
+    def is_unchanged(self, file_path: str, stat) -> bool:
+        entry = self.entries.get(file_path)
+        return bool(entry) and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.path)
 
+def get_manifest_path():
+    return os.path.join(settings.CHROMA_PATH, "ingest_manifest.json")
+
+def hash_file(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_ids(file_path: str, content_hash: str, count: int):
+    # Deterministic per (path, content) so re-runs upsert instead of duplicating
+    prefix = hashlib.sha1(f"{file_path}:{content_hash}".encode("utf-8")).hexdigest()[:20]
+    return [f"{prefix}-{i}" for i in range(count)]
+
+def collect_files(path: str):
     if os.path.isdir(path):
-        print(f"Processing directory: {path}")
         for root, dirs, files in os.walk(path):
             for file in files:
-                file_path = os.path.join(root, file)
-                ingest_file(file_path)
-    else:
-        ingest_file(path)
+                if os.path.splitext(file)[1].lower() in SUPPORTED_EXTENSIONS:
+                    yield os.path.join(root, file)
+    elif os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS:
+        yield path
 
-def ingest_file(file_path: str):
+def load_and_split(file_path: str, known_hash: str = None, chunk_size: int = 1000, chunk_overlap: int = 100):
+    # Runs inside a worker process; everything returned must be picklable
     ext = os.path.splitext(file_path)[1].lower()
-    if ext not in ['.pdf', '.docx', '.doc', '.txt', '.md']:
-        # Skip unsupported files without error message if in directory mode
-        return
+    try:
+        content_hash = hash_file(file_path)
+    except OSError as e:
+        return file_path, None, [], f"Error reading {file_path}: {e}"
+    if content_hash == known_hash:
+        # Only the mtime changed; nothing to re-embed
+        return file_path, content_hash, None, None
 
-    print(f"Loading {file_path}...")
-    
     try:
         if ext == '.pdf':
             loader = PyPDFLoader(file_path)
@@ -46,30 +135,266 @@ def ingest_file(file_path: str):
                 text = "\n".join([p.text for p in docx_doc.paragraphs])
                 docs = [Document(page_content=text, metadata={"source": file_path})]
             except ImportError:
-                print("python-docx not installed. Cannot process DOCX.")
-                return
+                return file_path, content_hash, [], "python-docx not installed. Cannot process DOCX."
         elif ext in ['.txt', '.md']:
             loader = TextLoader(file_path, encoding='utf-8')
             docs = loader.load()
         else:
-            return
+            return file_path, content_hash, [], None
     except Exception as e:
-        print(f"Error loading {file_path}: {e}")
-        return
+        return file_path, content_hash, [], f"Error loading {file_path}: {e}"
 
     if not docs:
-        print(f"No content extracted from {file_path}")
-        return
+        return file_path, content_hash, [], f"No content extracted from {file_path}"
 
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     splits = splitter.split_documents(docs)
-    
-    vectorstore = get_chroma_client()
-    vectorstore.add_documents(splits)
-    print(f"Successfully ingested {file_path} ({len(splits)} chunks)")
+    for split in splits:
+        split.metadata.setdefault("source", file_path)
+    return file_path, content_hash, splits, None
+
+class IngestPipeline:
+    """Load/split -> embed -> write, connected by bounded queues.
+
+    Loading and splitting run in a process pool, embeddings are computed in
+    fixed-size batches by a bounded number of threads, and Chroma writes are
+    batched by a single writer so memory stays flat on large corpora.
+    """
+
+    def __init__(self, manifest: IngestManifest, workers: int = None, embed_batch_size: int = 32,
+                 embed_concurrency: int = 2, write_batch_size: int = 256, queue_size: int = 8):
+        self.manifest = manifest
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.embed_batch_size = embed_batch_size
+        self.embed_concurrency = embed_concurrency
+        self.write_batch_size = write_batch_size
+        self.embed_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+        self.stats = {
+            "split": StageStats("split"),
+            "embed": StageStats("embed"),
+            "write": StageStats("write"),
+        }
+        self.files_ingested = 0
+        self.files_skipped = 0
+        self.files_removed = 0
+        self.errors = 0
+        # Embed threads and the writer report errors concurrently
+        self._errors_lock = threading.Lock()
+        # file path -> (stat, content hash, chunk ids) awaiting a successful write
+        self.pending_files = {}
+        self.written_ids = set()
+        self.root = None
+        self.given_root = None
+
+    def _error(self, message: str):
+        print(message)
+        with self._errors_lock:
+            self.errors += 1
+
+    def _embed_worker(self, embeddings):
+        while True:
+            item = self.embed_queue.get()
+            if item is None:
+                self.write_queue.put(None)
+                return
+            ids, batch = item
+            self.stats["embed"].start()
+            try:
+                vectors = embeddings.embed_documents([doc.page_content for doc in batch])
+            except Exception as e:
+                self._error(f"Error embedding batch of {len(batch)} chunks: {e}")
+                continue
+            self.stats["embed"].record(len(batch))
+            self.write_queue.put((ids, batch, vectors))
+
+    def _flush(self, store, ids, docs, vectors):
+        if not docs:
+            return
+        self.stats["write"].start()
+        texts = [doc.page_content for doc in docs]
+        try:
+            # add_texts upserts, and takes the vectors from PrecomputedEmbeddings
+            store.embeddings.vectors = dict(zip(texts, vectors))
+            store.add_texts(texts, metadatas=[doc.metadata for doc in docs], ids=ids)
+            get_lexical_index().add(ids, texts, [doc.metadata.get("source") for doc in docs])
+        except Exception as e:
+            self._error(f"Error writing batch of {len(docs)} chunks: {e}")
+            return
+        finally:
+            store.embeddings.vectors = {}
+        self.written_ids.update(ids)
+        self.stats["write"].record(len(docs))
+
+    def _writer(self, store):
+        pending_ids, pending_docs, pending_vectors = [], [], []
+        finished_embedders = 0
+        while finished_embedders < self.embed_concurrency:
+            item = self.write_queue.get()
+            if item is None:
+                finished_embedders += 1
+                continue
+            ids, docs, vectors = item
+            pending_ids.extend(ids)
+            pending_docs.extend(docs)
+            pending_vectors.extend(vectors)
+            if len(pending_docs) >= self.write_batch_size:
+                self._flush(store, pending_ids, pending_docs, pending_vectors)
+                pending_ids, pending_docs, pending_vectors = [], [], []
+        self._flush(store, pending_ids, pending_docs, pending_vectors)
+
+    def _delete_chunks(self, collection, file_path: str, keep=()):
+        # Drops the file's manifest entry and every chunk of it not in ``keep``
+        entry = self.manifest.entries.pop(file_path, None)
+        if entry:
+            ids = entry["chunk_ids"]
+        else:
+            # Chunks from runs that predate the manifest are only known by source
+            ids = collection.get(where={"source": {"$in": self._legacy_sources(file_path)}}, include=[])["ids"]
+        keep = set(keep)
+        stale = [i for i in ids if i not in keep]
+        if stale:
+            collection.delete(ids=stale)
+            get_lexical_index().delete(ids=stale)
+
+    def _legacy_sources(self, file_path: str) -> list:
+        # Before the manifest, source was the path as walked from --path, usually relative
+        sources = {file_path, os.path.relpath(file_path)}
+        if self.given_root is not None:
+            walked = self.given_root if file_path == self.root else os.path.join(self.given_root, os.path.relpath(file_path, self.root))
+            sources.add(walked)
+        return sorted(sources)
+
+    def _enqueue_splits(self, collection, stats, file_path: str, content_hash: str, splits, error):
+        if error:
+            self._error(error)
+            return
+        stat = stats[file_path]
+        if splits is None:
+            self.manifest.entries[file_path]["mtime"] = stat.st_mtime
+            self.files_skipped += 1
+            return
+
+        # The old chunks stay searchable until the new ones are written
+        ids = chunk_ids(file_path, content_hash, len(splits))
+        self.pending_files[file_path] = (stat, content_hash, ids)
+        if not splits:
+            return
+        self.stats["split"].record(len(splits))
+        for i in range(0, len(splits), self.embed_batch_size):
+            # Blocks when the embedders fall behind, which throttles loading
+            self.embed_queue.put((ids[i:i + self.embed_batch_size], splits[i:i + self.embed_batch_size]))
+        self.files_ingested += 1
+        print(f"Split {file_path} ({len(splits)} chunks)")
+
+    def _remove_missing(self, collection, root: str, seen: set):
+        prefix = root.rstrip(os.sep) + os.sep
+        for file_path in list(self.manifest.entries):
+            if file_path in seen or not (file_path == root or file_path.startswith(prefix)):
+                continue
+            self._delete_chunks(collection, file_path)
+            self.files_removed += 1
+            print(f"Removed chunks of deleted file {file_path}")
+
+    def _commit_manifest(self, collection):
+        for file_path, (stat, content_hash, ids) in self.pending_files.items():
+            # A file is recorded, and its previous chunks dropped, only once
+            # every new chunk is stored, so a failed batch keeps the old
+            # version searchable and is retried on the next run
+            if all(i in self.written_ids for i in ids):
+                try:
+                    self._delete_chunks(collection, file_path, keep=ids)
+                except Exception as e:
+                    self._error(f"Error removing old chunks of {file_path}: {e}")
+                    continue
+                self.manifest.entries[file_path] = {
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "sha256": content_hash,
+                    "chunk_ids": ids,
+                }
+        self.manifest.save()
+
+    def run(self, root: str, files, given_root: str = None):
+        # given_root is --path as typed, used to find chunks stored before the manifest
+        self.root = root
+        self.given_root = given_root
+        embeddings = get_embeddings()
+        collection = get_chroma_client()
+
+        embedders = [
+            threading.Thread(target=self._embed_worker, args=(embeddings,), daemon=True)
+            for _ in range(self.embed_concurrency)
+        ]
+        writer = threading.Thread(target=self._writer, args=(create_vectorstore(PrecomputedEmbeddings(embeddings)),), daemon=True)
+        for t in embedders:
+            t.start()
+        writer.start()
+
+        max_in_flight = self.workers * 2
+        stats = {}
+        self.stats["split"].start()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = set()
+            for file_path in files:
+                stat = os.stat(file_path)
+                stats[file_path] = stat
+                # Unchanged size and mtime: skip without reading the file
+                if self.manifest.is_unchanged(file_path, stat):
+                    self.files_skipped += 1
+                    continue
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._enqueue_splits(collection, stats, *future.result())
+                known_hash = self.manifest.entries.get(file_path, {}).get("sha256")
+                in_flight.add(pool.submit(load_and_split, file_path, known_hash))
+            for future in wait(in_flight).done:
+                self._enqueue_splits(collection, stats, *future.result())
+
+        self._remove_missing(collection, root, set(stats))
+
+        for _ in embedders:
+            self.embed_queue.put(None)
+        for t in embedders:
+            t.join()
+        writer.join()
+        self._commit_manifest(collection)
+
+    def report(self):
+        print(
+            f"Ingested {self.files_ingested} files, skipped {self.files_skipped} unchanged, "
+            f"removed {self.files_removed} deleted ({self.errors} errors)"
+        )
+        for stage in self.stats.values():
+            print(stage.report())
+
+def ingest_path(path: str, workers: int = None, batch_size: int = 32, concurrency: int = 2, force: bool = False):
+    if not os.path.exists(path):
+        print(f"Path {path} not found.")
+        return
+
+    given_root = path
+    path = os.path.abspath(path)
+    if os.path.isdir(path):
+        print(f"Processing directory: {path}")
+
+    manifest = IngestManifest(get_manifest_path())
+    if force:
+        # Forget the recorded hashes but keep chunk IDs so old chunks are still replaced
+        for entry in manifest.entries.values():
+            entry["size"] = entry["mtime"] = entry["sha256"] = None
+
+    pipeline = IngestPipeline(manifest, workers=workers, embed_batch_size=batch_size, embed_concurrency=concurrency)
+    pipeline.run(path, collect_files(path), given_root=given_root)
+    pipeline.report()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Ingest notes into the vectorstore")
     parser.add_argument("--path", required=True, help="Path to the file or directory to ingest")
+    parser.add_argument("--workers", type=int, default=None, help="Processes used for loading and splitting")
+    parser.add_argument("--batch-size", type=int, default=32, help="Chunks per embedding request")
+    parser.add_argument("--concurrency", type=int, default=2, help="Embedding requests in flight")
+    parser.add_argument("--force", action="store_true", help="Re-embed every file even if unchanged")
     args = parser.parse_args()
-    ingest_path(args.path)
+    ingest_path(args.path, workers=args.workers, batch_size=args.batch_size, concurrency=args.concurrency, force=args.force)
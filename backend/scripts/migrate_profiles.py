@@ -0,0 +1,61 @@
+import os
+import sys
+import argparse
+
+# Add the parent directory to sys.path to allow importing from 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from app.config import settings
+from app.memory.profile_store import JsonProfileStore, SqliteProfileStore
+
+PROFILE_SUFFIX = "_profile.json"
+SUMMARY_SUFFIX = "_summary.txt"
+
+def find_legacy_users(data_path: str) -> list:
+    users = set()
+    for filename in os.listdir(data_path):
+        for suffix in (PROFILE_SUFFIX, SUMMARY_SUFFIX):
+            if filename.endswith(suffix):
+                users.add(filename[:-len(suffix)])
+    return sorted(users)
+
+def migrate(data_path: str, db_path: str, force: bool = False):
+    if not os.path.isdir(data_path):
+        print(f"Nothing to migrate: {data_path} does not exist")
+        return
+
+    source = JsonProfileStore()
+    target = SqliteProfileStore(db_path, import_legacy=False)
+    profiles = summaries = skipped = failed = 0
+
+    for user_id in find_legacy_users(data_path):
+        try:
+            if not force and target.has_profile(user_id):
+                skipped += 1
+                continue
+            if os.path.exists(os.path.join(data_path, user_id + PROFILE_SUFFIX)):
+                target.save_profile(source.load_profile(user_id))
+                profiles += 1
+            summary = source.load_summary(user_id)
+            if summary is not None:
+                target.save_summary(user_id, summary)
+                summaries += 1
+        except Exception as e:
+            failed += 1
+            print(f"Failed to migrate {user_id}: {e}")
+
+    print(f"Migrated {profiles} profiles and {summaries} summaries into {db_path}")
+    print(f"Skipped {skipped} users already in the database, {failed} failed")
+    print("The JSON and text files were left in place; set PROFILE_BACKEND=json to go back to them.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import *_profile.json and *_summary.txt files into the SQLite profile store")
+    parser.add_argument("--data-path", default=settings.USER_DATA_PATH, help="Directory holding the legacy user files")
+    parser.add_argument("--db", default=None, help="SQLite database to write (default: profiles.sqlite3 in --data-path)")
+    parser.add_argument("--force", action="store_true", help="Overwrite users that already exist in the database")
+    args = parser.parse_args()
+    settings.USER_DATA_PATH = args.data_path
+    migrate(args.data_path, args.db or os.path.join(args.data_path, "profiles.sqlite3"), force=args.force)
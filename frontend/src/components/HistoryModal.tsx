@@ -1,5 +1,5 @@
 import React from 'react';
-import type { SessionHistory } from '../services/api';
+import type { SessionSummary } from '../services/api';
 import { Button } from './ui/Button';
 import { Card, CardContent, CardHeader, CardTitle } from './ui/Card';
 import { Badge } from './ui/Badge';
@@ -8,10 +8,12 @@ import { GraduationCap, Sparkles } from 'lucide-react';
 interface HistoryModalProps {
     isOpen: boolean;
     onClose: () => void;
-    history: SessionHistory[];
+    history: SessionSummary[];
+    hasMore?: boolean;
+    onLoadMore?: () => void;
 }
 
-const HistoryModal: React.FC<HistoryModalProps> = ({ isOpen, onClose, history }) => {
+const HistoryModal: React.FC<HistoryModalProps> = ({ isOpen, onClose, history, hasMore, onLoadMore }) => {
     if (!isOpen) return null;
 
     return (
@@ -55,7 +57,7 @@ const HistoryModal: React.FC<HistoryModalProps> = ({ isOpen, onClose, history })
                                             <h4 className="font-black text-xl text-slate-800 tracking-tight">Study Session</h4>
                                         </div>
                                         <Badge className="text-[11px] bg-white border-slate-100 text-slate-500 rounded-2xl py-2 px-5 font-black shadow-sm">
-                                            {session.messages.length} Interactions
+                                            {session.message_count} Interactions
                                         </Badge>
                                     </div>
 
@@ -92,11 +94,18 @@ const HistoryModal: React.FC<HistoryModalProps> = ({ isOpen, onClose, history })
                                     <div className="pt-5 border-t border-slate-100 relative z-10">
                                         <p className="text-[11px] text-slate-400 italic truncate font-bold flex items-center gap-2">
                                             <span className="text-vibrant-blue text-lg">“</span>
-                                            {session.messages[session.messages.length - 1]?.content}
+                                            {session.last_message}
                                         </p>
                                     </div>
                                 </div>
                             ))}
+                            {hasMore && onLoadMore && (
+                                <div className="flex justify-center">
+                                    <Button variant="ghost" onClick={onLoadMore} className="rounded-[1.5rem] px-8 h-12 text-[12px] font-black text-vibrant-blue uppercase tracking-widest hover:bg-vibrant-blue/10">
+                                        Load older sessions
+                                    </Button>
+                                </div>
+                            )}
                         </div>
                     )}
                 </CardContent>
@@ -1,6 +1,6 @@
 import { useState, useCallback } from 'react';
 import { chatService, userService, assessmentService, uploadService } from '../services/api';
-import type { UserProfile, SessionHistory } from '../services/api';
+import type { UserProfile, SessionSummary } from '../services/api';
 import type { MCQQuestion } from '../components/MCQQuiz';
 import type { QAQuestion } from '../components/QAQuiz';
 
@@ -14,7 +14,8 @@ export const useChat = (userId: string) => {
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState<string | null>(null);
     const [profile, setProfile] = useState<UserProfile | null>(null);
-    const [history, setHistory] = useState<SessionHistory[]>([]);
+    const [history, setHistory] = useState<SessionSummary[]>([]);
+    const [historyCursor, setHistoryCursor] = useState<string | null>(null);
     const [mode, setMode] = useState<'study' | 'mcq' | 'qa'>('study');
     const [quizQuestions, setQuizQuestions] = useState<(MCQQuestion | QAQuestion)[]>([]);
     const [mcqStartIndex, setMcqStartIndex] = useState<number | null>(null);
@@ -31,12 +32,24 @@ export const useChat = (userId: string) => {
     const fetchHistory = useCallback(async () => {
         try {
             const data = await chatService.getHistory(userId);
-            setHistory(data);
+            setHistory(data.sessions);
+            setHistoryCursor(data.next_cursor);
         } catch (err) {
             console.error("Failed to fetch history", err);
         }
     }, [userId]);
 
+    const loadMoreHistory = useCallback(async () => {
+        if (!historyCursor) return;
+        try {
+            const data = await chatService.getHistory(userId, historyCursor);
+            setHistory((prev) => [...prev, ...data.sessions]);
+            setHistoryCursor(data.next_cursor);
+        } catch (err) {
+            console.error("Failed to fetch more history", err);
+        }
+    }, [userId, historyCursor]);
+
     const sendMessage = async (text: string, sessionId: string = "default") => {
         const userMessage: Message = { role: 'user', content: text };
         setMessages((prev) => [...prev, userMessage]);
@@ -178,7 +191,7 @@ const handleSubmissionError = (error: any) => {
 
     return { 
         messages, sendMessage, loading, error, profile, history, mode, quizQuestions,
-        mcqStartIndex, fetchProfile, fetchHistory, resetChat, runAssessment, runRevision, setMode,
+        mcqStartIndex, fetchProfile, fetchHistory, loadMoreHistory, hasMoreHistory: historyCursor !== null, resetChat, runAssessment, runRevision, setMode,
         setMcqStartIndex, submitMCQBatch, submitQABatch, uploadFile
     };
 };
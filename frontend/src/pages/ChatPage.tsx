@@ -8,7 +8,7 @@ const ChatPage: React.FC = () => {
     const userId = "user123"; 
     const [isHistoryOpen, setIsHistoryOpen] = useState(false);
     const { 
-        messages, sendMessage, loading, error, profile, fetchProfile, fetchHistory, 
+        messages, sendMessage, loading, error, profile, fetchProfile, fetchHistory, loadMoreHistory, hasMoreHistory,
         resetChat, runAssessment, runRevision, history, mode, mcqStartIndex, setMode,
         quizQuestions, submitMCQBatch, submitQABatch, uploadFile
     } = useChat(userId);
@@ -77,6 +77,8 @@ const ChatPage: React.FC = () => {
                 isOpen={isHistoryOpen} 
                 onClose={() => setIsHistoryOpen(false)} 
                 history={history} 
+                hasMore={hasMoreHistory}
+                onLoadMore={loadMoreHistory}
             />
         </div>
     );
@@ -43,6 +43,23 @@ export interface SessionHistory {
     created_at: string;
 }
 
+export interface SessionSummary {
+    session_id: string;
+    user_id: string;
+    created_at: string;
+    updated_at: string;
+    message_count: number;
+    last_message: string;
+    mastered_concepts: string[];
+    weak_areas: string[];
+    topic_mastery: Record<string, number>;
+}
+
+export interface SessionPage {
+    sessions: SessionSummary[];
+    next_cursor: string | null;
+}
+
 export const chatService = {
     sendMessage: async (userId: string, message: string, sessionId: string = "default") => {
         const response = await api.post<{ response: string, mastery_updates: Record<string, number> }>('/chat', { 
@@ -98,8 +115,14 @@ export const chatService = {
             clearTimeout(timeoutId);
         }
     },
-    getHistory: async (userId: string) => {
-        const response = await api.get<SessionHistory[]>(`/history/${userId}`);
+    getHistory: async (userId: string, cursor?: string | null, limit: number = 20) => {
+        const response = await api.get<SessionPage>(`/history/${userId}`, {
+            params: { limit, ...(cursor ? { cursor } : {}) }
+        });
+        return response.data;
+    },
+    getSession: async (userId: string, sessionId: string) => {
+        const response = await api.get<SessionHistory>(`/history/${userId}/${sessionId}`);
         return response.data;
     }
 };